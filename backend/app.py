@@ -2,14 +2,25 @@ import os
 from flask import Flask
 from flask_cors import CORS
 from extensions import db
+from json_provider import FastJSONProvider
+from compression import init_compression
+from broker import init_broker
+from archive import init_archiver
+from jobs import init_jobs
+from uploads import init_uploads
 # 对应你的 backend/routes 文件夹
-from routes import auth, skills, lost_items, messages
+from routes import auth, skills, lost_items, messages, realtime, upload_sessions, media, jobs
 
-def create_app():
+def create_app(config=None):
+    """config: 覆盖下面的默认配置 (测试 / 脚本用)，在初始化数据库和各个组件之前生效"""
     # 1. 明确指定 static 文件夹为当前目录下的 'static'
     app = Flask(__name__, static_folder='static')
+    # JSON 序列化: 装了 orjson 时自动使用，否则退回默认实现
+    app.json = FastJSONProvider(app)
     app.json.ensure_ascii = False
     CORS(app)
+    # 大于 1KB 的 JSON 响应按 Accept-Encoding 压缩
+    init_compression(app)
 
     basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -23,14 +34,34 @@ def create_app():
     # 3. 上传文件路径 (指向 backend/static/uploads)
     app.config['UPLOAD_FOLDER'] = os.path.join(basedir, 'static', 'uploads')
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # 上传大小上限 (MAX_CONTENT_LENGTH) 和流式落盘
+    init_uploads(app)
+    # 图片下载交给前置代理: 'nginx' (X-Accel-Redirect) / 'sendfile' (X-Sendfile)，不设则由 Flask 直接发送
+    app.config['MEDIA_ACCEL'] = os.environ.get('MEDIA_ACCEL')
+    # 上传后的缩略图 / 变体生成等后台任务的 worker 线程数 (见 jobs.py)，0 表示不启动；
+    # 必须在处理请求的进程里跑，服务入口默认 2 个，见下面的 __main__
+    app.config['JOBS_WORKERS'] = int(os.environ.get('JOBS_WORKERS', 0))
+    # 聊天记录归档线程的间隔 (秒)，0 表示不启动；服务入口默认每小时一轮，见下面的 __main__
+    app.config['ARCHIVE_INTERVAL'] = int(os.environ.get('ARCHIVE_INTERVAL', 0))
+    app.config.update(config or {})
 
     db.init_app(app)
+    # 实时事件代理 (默认进程内实现)
+    init_broker(app)
+    # 后台定期把半年前的聊天记录搬到归档表
+    init_archiver(app)
+    init_jobs(app)
 
     # 注册蓝图
     app.register_blueprint(auth.bp, url_prefix='/api')
     app.register_blueprint(skills.bp, url_prefix='/api')
     app.register_blueprint(lost_items.bp, url_prefix='/api')
     app.register_blueprint(messages.bp, url_prefix='/api')
+    app.register_blueprint(realtime.bp, url_prefix='/api')
+    app.register_blueprint(upload_sessions.bp, url_prefix='/api')
+    # 上传的图片: 长缓存 + Range，可交给 Nginx 发送 (见 routes/media.py)
+    app.register_blueprint(media.bp, url_prefix='/media')
+    app.register_blueprint(jobs.bp, url_prefix='/api')
 
     @app.route('/')
     def index():
@@ -39,6 +70,12 @@ def create_app():
     return app
 
 if __name__ == '__main__':
+    # 归档线程和任务 worker 只在处理请求的进程里跑 (gunicorn 等部署时用环境变量
+    # ARCHIVE_INTERVAL=3600 JOBS_WORKERS=2 打开)。debug 模式下 Werkzeug 的 reloader 会先起一个
+    # 只负责监视文件改动的父进程，真正处理请求的是它拉起的子进程 (WERKZEUG_RUN_MAIN=true)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        os.environ.setdefault('ARCHIVE_INTERVAL', '3600')
+        os.environ.setdefault('JOBS_WORKERS', '2')
     app = create_app()
     # 允许局域网访问
     print("🚀 后端服务启动: http://127.0.0.1:5000")
@@ -0,0 +1,141 @@
+"""
+聊天记录归档: 把很久以前的消息从 messages 搬到 messages_archive
+
+messages 表只保留最近 ARCHIVE_AFTER_DAYS 天的热数据，聊天接口的查询都落在这张小表上；
+更早的消息由后台线程定期分批搬走。
+消息 id 自增、和时间同序，所以同一个会话里归档的消息 id 一定都比热表里的小:
+向上翻页时先查热表，热表这一页不够了才接着去归档表里查，对客户端是透明的。
+conversations.archived_max_id 记着每个会话归档到哪儿了，从没归档过的会话 (绝大多数) 不会去碰归档表。
+
+用法: python archive.py    # 手动执行一轮归档
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select
+from extensions import db
+from models import Conversation, Message, MessageArchive
+
+ARCHIVED_COLUMNS = ['id', 'sender_id', 'receiver_id', 'conversation_key', 'content', 'create_time']
+
+
+def _archive_boundary(cutoff):
+    """
+    第一条不早于 cutoff 的消息 id，比它小的消息都该归档 (表是空的时返回 None)
+    id 和时间同序，按主键二分查找，每次只按主键取一行，不扫表也不需要 create_time 上的索引
+    """
+    lo, hi = db.session.query(func.min(Message.id), func.max(Message.id)).one()
+    if lo is None:
+        return None
+    hi += 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        row = db.session.query(Message.id, Message.create_time) \
+            .filter(Message.id >= mid).order_by(Message.id).first()
+        if row.create_time is not None and row.create_time < cutoff:
+            lo = row.id + 1  # row 以及它之前的都够老了
+        else:
+            hi = mid  # [mid, row.id) 之间没有消息，从 mid 开始都不用归档
+    return lo
+
+
+def archive_messages(days, batch_size=1000):
+    """
+    把 days 天以前的消息搬到归档表，每批 batch_size 条一个事务，返回搬走的条数
+    先按主键二分出边界 id，之后每批都是主键上 id < 边界的范围扫描，没有可归档的消息时不会扫表
+    """
+    boundary = _archive_boundary(datetime.now() - timedelta(days=days))
+    moved = 0
+    while boundary is not None:
+        ids = [row[0] for row in db.session.query(Message.id)
+               .filter(Message.id < boundary)
+               .order_by(Message.id).limit(batch_size)]
+        if not ids:
+            break
+
+        keys = [row[0] for row in db.session.query(Message.conversation_key)
+                .filter(Message.id.in_(ids)).distinct()]
+        db.session.execute(insert(MessageArchive).from_select(
+            ARCHIVED_COLUMNS,
+            select(*[getattr(Message, c) for c in ARCHIVED_COLUMNS]).where(Message.id.in_(ids))
+        ))
+        mark_archived(keys)
+        Message.query.filter(Message.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        moved += len(ids)
+    return moved
+
+
+def mark_archived(keys=None):
+    """
+    按归档表更新会话的 archived_max_id (keys 为 None 时更新所有会话)
+    调用方负责 commit，和搬消息在同一个事务里
+    """
+    latest = select(func.max(MessageArchive.id)) \
+        .where(MessageArchive.conversation_key == Conversation.conversation_key).scalar_subquery()
+    query = Conversation.query
+    if keys is not None:
+        query = query.filter(Conversation.conversation_key.in_([k for k in keys if k]))
+    query.update({Conversation.archived_max_id: latest}, synchronize_session=False)
+
+
+def archived_max_id(key):
+    """这个会话在归档表里最大的消息 id，从没归档过时返回 None"""
+    return db.session.query(Conversation.archived_max_id) \
+        .filter(Conversation.conversation_key == key).scalar()
+
+
+def fetch_before(key, before_id, limit):
+    """从归档表取某个会话 before_id 之前最近的 limit 条 (倒序)"""
+    query = MessageArchive.query.filter(MessageArchive.conversation_key == key)
+    if before_id is not None:
+        query = query.filter(MessageArchive.id < before_id)
+    return query.order_by(MessageArchive.id.desc()).limit(limit).all()
+
+
+def fetch_since(key, since_id, limit):
+    """
+    从归档表取某个会话 since_id 之后的 limit 条 (正序)
+    只有这个会话归档过、并且 since_id 比它归档的最大 id 还小时才查 (客户端从很早的位置往后翻)，
+    轮询 / SSE 的常规请求不会碰归档表
+    """
+    archived = archived_max_id(key)
+    if not archived or since_id >= archived:
+        return []
+    return MessageArchive.query \
+        .filter(MessageArchive.conversation_key == key, MessageArchive.id > since_id) \
+        .order_by(MessageArchive.id.asc()).limit(limit).all()
+
+
+def init_archiver(app):
+    """
+    启动后台归档线程 (ARCHIVE_INTERVAL 秒一轮)
+    默认不启动: 只有服务入口 (python app.py，或部署时设置环境变量 ARCHIVE_INTERVAL) 才打开，
+    迁移、检查之类调用 create_app() 的脚本不会顺带起一个归档线程
+    """
+    app.config.setdefault('ARCHIVE_AFTER_DAYS', 180)
+    app.config.setdefault('ARCHIVE_INTERVAL', 0)
+    interval = app.config['ARCHIVE_INTERVAL']
+    if not interval or app.testing:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    moved = archive_messages(app.config['ARCHIVE_AFTER_DAYS'])
+                    if moved:
+                        print(f">>> 已归档 {moved} 条消息")
+            except Exception as e:
+                print(f"Archive error: {e}")
+
+    threading.Thread(target=run, daemon=True, name='message-archiver').start()
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        print(f">>> 已归档 {archive_messages(app.config['ARCHIVE_AFTER_DAYS'])} 条消息")
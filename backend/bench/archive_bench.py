@@ -0,0 +1,83 @@
+"""
+聊天记录归档的基准测试
+
+按不同的消息总量造数据 (大部分是一年前的冷数据，热数据的量固定)，对每种规模测:
+  - 归档前后 GET /api/messages 第一页的延迟 (应该基本不随总量变化)
+  - archive_messages 搬完冷数据的耗时，以及紧接着再跑一轮 (没有可归档的消息) 的耗时
+
+用法: python bench/archive_bench.py [总量,总量,...]    # 默认 10000,100000,300000
+"""
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from common import make_app, summarize, timed
+from extensions import db
+from models import Conversation, Message, MessageArchive, User
+from utils import conversation_key
+import archive
+
+CONVERSATIONS = 100
+HOT_MESSAGES = 5000  # 最近几天的消息，不随总量变化
+REPEAT = 200
+_BATCH = 10000
+
+
+def seed(total):
+    users = [{'id': i, 'username': f'u{i}', 'password': 'x', 'contact': 'c'}
+             for i in range(1, CONVERSATIONS * 2 + 1)]
+    db.session.execute(insert(User), users)
+    now = datetime.now()
+    pairs = [(2 * i + 1, 2 * i + 2) for i in range(CONVERSATIONS)]
+    db.session.execute(insert(Conversation), [
+        {'conversation_key': conversation_key(a, b), 'user_a': a, 'user_b': b, 'last_time': now}
+        for a, b in pairs])
+
+    # id 和时间同序: 先是一年前开始的冷数据，然后是最近一天的热数据
+    cold = total - HOT_MESSAGES
+    old_start, hot_start = now - timedelta(days=365), now - timedelta(days=1)
+    rows = []
+    for i in range(total):
+        a, b = pairs[i % CONVERSATIONS]
+        if i % 2:
+            a, b = b, a
+        when = old_start + timedelta(seconds=i) if i < cold else hot_start + timedelta(seconds=i - cold)
+        rows.append({'sender_id': a, 'receiver_id': b, 'conversation_key': conversation_key(a, b),
+                     'content': f'消息 {i}', 'create_time': when})
+        if len(rows) == _BATCH:
+            db.session.execute(insert(Message), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(Message), rows)
+    db.session.commit()
+
+
+def hot_page_latency(client):
+    samples = []
+    for _ in range(REPEAT):
+        resp, ms = timed(client.get, '/api/messages?user_id=1&partner_id=2')
+        assert resp.status_code == 200, resp.get_json()
+        samples.append(ms)
+    return summarize(samples)
+
+
+def run(total):
+    app, _ = make_app()
+    client = app.test_client()
+    with app.app_context():
+        seed(total)
+        before = hot_page_latency(client)
+        moved, archive_ms = timed(archive.archive_messages, app.config['ARCHIVE_AFTER_DAYS'])
+        _, noop_ms = timed(archive.archive_messages, app.config['ARCHIVE_AFTER_DAYS'])
+        after = hot_page_latency(client)
+        hot, cold = Message.query.count(), MessageArchive.query.count()
+        db.session.remove()
+    print(f"{total:>9} | {hot:>6} / {cold:>8} | {moved:>8} {archive_ms:>10.0f} {noop_ms:>9.2f} | {before} | {after}")
+
+
+if __name__ == '__main__':
+    totals = [int(n) for n in sys.argv[1].split(',')] if len(sys.argv) > 1 else [10000, 100000, 300000]
+    print(f"每个会话 {HOT_MESSAGES // CONVERSATIONS} 条热消息，第一页延迟取 {REPEAT} 次 (毫秒 p50 / p95 / max)")
+    print(f"{'总量':>7} | {'热表 / 归档表':>13} | {'搬走':>6} {'归档ms':>8} {'空跑ms':>7} | "
+          f"{'归档前第一页':^30} | {'归档后第一页':^30}")
+    for total in totals:
+        run(total)
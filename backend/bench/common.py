@@ -0,0 +1,48 @@
+"""
+基准测试脚本共用的部分: 建一个独立的 app (临时目录里的 SQLite 文件 + 临时上传目录)，以及计时统计
+
+默认不碰 app.py 里配置的 MySQL。想在真实数据库上跑时设置 BENCH_DATABASE_URI，
+指向一个空的库 (脚本会 drop_all / create_all，不要指向线上库)。
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+
+
+def make_app(**config):
+    """新建一个空库的 app，返回 (app, 临时目录)"""
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    upload_folder = os.path.join(workdir, 'uploads')
+    os.makedirs(upload_folder)
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': os.environ.get('BENCH_DATABASE_URI')
+        or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'UPLOAD_FOLDER': upload_folder,
+        'JOBS_SYNC': True, 'JOBS_WORKERS': 0, 'ARCHIVE_INTERVAL': 0,
+        **config,
+    })
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app, workdir
+
+
+def timed(fn, *args, **kwargs):
+    """执行一次，返回 (结果, 耗时毫秒)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def summarize(samples):
+    """毫秒样本 -> 'p50 / p95 / max' 字符串"""
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"{statistics.median(samples):8.2f} / {p95:8.2f} / {samples[-1]:8.2f}"
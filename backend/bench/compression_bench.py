@@ -0,0 +1,84 @@
+"""
+列表接口 JSON 序列化和压缩的基准测试
+
+造 5000 条失物 (中文标题 / 描述 / 地点)，按 /api/lost-items 的字段拼出 5000 条的响应体，测:
+  - Flask 默认 JSON 实现和 FastJSONProvider (装了 orjson 时) 的序列化耗时
+  - 不压缩 / gzip / deflate 的字节数和压缩耗时 (COMPRESS_LEVEL 级别)
+再通过接口取一页 (limit=100)，对比 Accept-Encoding 不同时实际发出去的字节数。
+
+用法: python bench/compression_bench.py [条数]    # 默认 5000
+"""
+import sys
+from datetime import datetime, timedelta
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import insert
+from common import make_app, timed
+from compression import compress_body
+from extensions import db
+from json_provider import FastJSONProvider, orjson
+from models import LostItem, User
+from routes.lost_items import LOST_LIST_FIELDS
+from utils import MAX_PAGE_SIZE, pack_row, select_columns
+
+REPEAT = 20
+PLACES = ['图书馆三楼', '第二食堂', '东区操场', '教学楼 A304', '宿舍 7 号楼', '校医院门口']
+THINGS = ['校园卡', '黑色雨伞', '蓝牙耳机', '学生证', '钥匙串', '保温杯', '笔记本电脑', '眼镜']
+
+
+def seed(count):
+    db.session.execute(insert(User), [{'id': 1, 'username': '张同学', 'password': 'x', 'contact': 'c'}])
+    now = datetime.now()
+    db.session.execute(insert(LostItem), [{
+        'title': f"{'捡到' if i % 2 else '丢失'}{THINGS[i % len(THINGS)]}",
+        'desc': f"{now.month}月{i % 28 + 1}日下午在{PLACES[i % len(PLACES)]}附近，"
+                f"{THINGS[i % len(THINGS)]}，有认识的同学请联系我，谢谢！编号 {i}",
+        'location': PLACES[i % len(PLACES)], 'type': i % 2, 'user_id': 1, 'status': 0,
+        'image': f'http://localhost:5000/media/ab/cd/{i:064x}.jpg',
+        'create_time': now - timedelta(minutes=i),
+    } for i in range(count)])
+    db.session.commit()
+
+
+def payload():
+    """和 get_lost_items 输出一样的字段，只是不分页"""
+    fields = list(LOST_LIST_FIELDS)
+    rows = db.session.query(*select_columns(LOST_LIST_FIELDS, fields, LostItem.id, LostItem.create_time)) \
+        .outerjoin(User, User.id == LostItem.user_id).order_by(LostItem.create_time.desc()).all()
+    return {"code": 200, "data": [pack_row(r, fields, LOST_LIST_FIELDS) for r in rows], "next_cursor": None}
+
+
+def best_of(fn, *args):
+    return min(timed(fn, *args)[1] for _ in range(REPEAT))
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    app, _ = make_app()
+    with app.app_context():
+        seed(count)
+        obj = payload()
+
+        print(f"{count} 条失物，耗时取 {REPEAT} 次里最快的一次 (毫秒)")
+        default = DefaultJSONProvider(app)
+        default.ensure_ascii = False
+        body = None
+        for name, provider in [('默认 json', default), ('FastJSONProvider', app.json)]:
+            body = provider.dumps(obj)
+            print(f"序列化 {name:<18} {best_of(provider.dumps, obj):8.2f} ms")
+        if orjson is None:
+            print("(没装 orjson，FastJSONProvider 用的是默认实现)")
+
+        raw = body.encode()
+        level = app.config['COMPRESS_LEVEL']
+        print(f"{'不压缩':<12} {len(raw) / 1024:9.1f} KB")
+        for encoding in ('gzip', 'deflate'):
+            compressed = compress_body(raw, encoding, level)
+            ms = best_of(compress_body, raw, encoding, level)
+            print(f"{encoding:<14} {len(compressed) / 1024:9.1f} KB  ({len(compressed) / len(raw):.1%})  "
+                  f"压缩 {ms:.2f} ms (level {level})")
+
+    client = app.test_client()
+    for encoding in ('identity', 'gzip', 'deflate'):
+        resp = client.get(f'/api/lost-items?limit={MAX_PAGE_SIZE}', headers={'Accept-Encoding': encoding})
+        print(f"GET /api/lost-items?limit={MAX_PAGE_SIZE} Accept-Encoding: {encoding:<9} "
+              f"{len(resp.get_data()):7} 字节  Content-Encoding: {resp.headers.get('Content-Encoding', '-')}")
@@ -0,0 +1,103 @@
+"""
+图片变体 (/media/<文件名>?w=) 的基准测试
+
+40 个并发请求 (模拟首页一屏卡片同时加载)，分三种情况:
+  - 冷缓存、40 个请求都要同一个变体 (同一个变体只生成一次，其余的等结果)
+  - 冷缓存、40 个请求要 40 个不同的变体 (超过 MEDIA_MAX_RENDERS 的很快返回 503)
+  - 上一步之后的热缓存
+再对比首页 20 张卡片原图和 w=200 变体的总字节数。
+
+用法: python bench/variant_bench.py [并发数]    # 默认 40
+"""
+import io
+import os
+import sys
+import threading
+from collections import Counter
+from PIL import Image
+from common import make_app, summarize, timed
+from extensions import db
+import storage
+import variants
+
+CARDS = 20
+ACCEPT = 'image/avif,image/webp,image/*;q=0.8'
+
+
+def make_photo(seed, size=(1600, 1200)):
+    """看起来像照片的 JPEG (渐变 + 噪点)，纯噪点或纯色的压缩率都不真实"""
+    gradient = Image.linear_gradient('L').resize(size).rotate(seed * 37 % 360)
+    noise = Image.effect_noise(size, 6 + seed % 6)
+    im = Image.merge('RGB', (gradient, noise, Image.blend(gradient, noise, 0.5)))
+    buf = io.BytesIO()
+    im.save(buf, 'JPEG', quality=90)
+    return buf.getvalue()
+
+
+def store(app, count):
+    """存 count 张不同的图，返回相对路径"""
+    paths = []
+    with app.app_context():
+        for i in range(count):
+            tmp = os.path.join(app.config['UPLOAD_FOLDER'], f'.bench-{i}.part')
+            with open(tmp, 'wb') as f:
+                f.write(make_photo(i))
+            paths.append(storage.put_path(tmp, 'jpg'))
+        db.session.commit()
+    return paths
+
+
+def fetch(client, url, headers=None):
+    resp, ms = timed(client.get, url, headers=headers or {})
+    size = len(resp.get_data())
+    resp.close()  # 释放 MEDIA_MAX_CONCURRENCY 的名额
+    return resp.status_code, ms, size
+
+
+def burst(app, urls):
+    """每个 URL 一个线程同时发出，返回 [(状态码, 毫秒, 字节数)]"""
+    results = [None] * len(urls)
+    barrier = threading.Barrier(len(urls))
+
+    def worker(i):
+        client = app.test_client()
+        barrier.wait()
+        results[i] = fetch(client, urls[i], {'Accept': ACCEPT})
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(urls))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def report(label, results):
+    statuses = Counter(status for status, _, _ in results)
+    print(f"{label:<22} {summarize([ms for _, ms, _ in results])}   "
+          + ", ".join(f"{code}: {n}" for code, n in sorted(statuses.items())))
+
+
+if __name__ == '__main__':
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    app, _ = make_app()
+    paths = store(app, concurrency + 1)
+    # 先生成一个不参与统计的变体，把转码进程池拉起来 (spawn 启动进程的时间不算进冷缓存)
+    fetch(app.test_client(), f'/media/{paths.pop()}?w=200', {'Accept': ACCEPT})
+    print(f"并发 {concurrency}，输出格式 {variants.MODERN_FORMATS or '原格式'}，"
+          f"MEDIA_MAX_RENDERS={app.config.get('MEDIA_MAX_RENDERS', 4)}，延迟为毫秒 p50 / p95 / max")
+
+    report("冷缓存 同一个变体", burst(app, [f'/media/{paths[0]}?w=400'] * concurrency))
+    distinct = [f'/media/{path}?w={variants.VARIANT_WIDTHS[i % 3]}' for i, path in enumerate(paths)]
+    report("冷缓存 各不相同", burst(app, distinct))
+    # 上一轮 503 的请求客户端会重试，先把变体补齐再测热缓存
+    for url in distinct:
+        fetch(app.test_client(), url, {'Accept': ACCEPT})
+    report("热缓存", burst(app, distinct))
+
+    client = app.test_client()
+    original = sum(fetch(client, f'/media/{path}')[2] for path in paths[:CARDS])
+    for fmt in ['jpg'] + variants.MODERN_FORMATS:
+        card = sum(fetch(client, f'/media/{path}?w=200&fmt={fmt}')[2] for path in paths[:CARDS])
+        print(f"首页 {CARDS} 张卡片 w=200 {fmt:<4}: {card / 1024:8.1f} KB  (原图 {original / 1024:.1f} KB，"
+              f"{card / original:.1%})")
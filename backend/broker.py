@@ -0,0 +1,109 @@
+"""
+实时事件的消息代理 (可插拔)
+
+写接口调用 publish_event() 发布事件，WebSocket / SSE 连接订阅 'user:<id>' 频道推给客户端。
+默认的 MemoryBroker 只在本进程内转发，适合单机部署和测试；
+多进程部署时实现一个同样接口的 Broker (例如基于 Redis pub/sub)，
+注册到 BROKER_BACKENDS 并设置 app.config['BROKER_BACKEND'] 即可。
+"""
+import queue
+import threading
+from abc import ABC, abstractmethod
+from flask import current_app
+
+
+class Subscription:
+    """一个订阅者: 内部是一个有界队列，消费太慢时丢弃新事件，不拖慢发布方"""
+
+    def __init__(self, broker, channel, maxsize=100):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def get(self, timeout=None):
+        """取下一条事件，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Broker(ABC):
+    """代理的接口，缺了哪个方法的实现在创建实例时就会报错，而不是等到第一次发布"""
+
+    @abstractmethod
+    def publish(self, channel, event):
+        """把 event 发给 channel 的所有订阅者"""
+
+    @abstractmethod
+    def subscribe(self, channel):
+        """订阅 channel，返回 Subscription"""
+
+    @abstractmethod
+    def unsubscribe(self, subscription):
+        """取消订阅 (Subscription.close 时调用)"""
+
+
+class MemoryBroker(Broker):
+    """进程内实现"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}  # channel -> {Subscription}
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for sub in subscribers:
+            try:
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def subscribe(self, channel):
+        sub = Subscription(self, channel)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subs = self._channels.get(subscription.channel)
+            if subs is not None:
+                subs.discard(subscription)
+                if not subs:
+                    del self._channels[subscription.channel]
+
+
+BROKER_BACKENDS = {'memory': MemoryBroker}
+
+
+def init_broker(app):
+    backend = app.config.setdefault('BROKER_BACKEND', 'memory')
+    app.extensions['broker'] = BROKER_BACKENDS[backend]()
+
+
+def get_broker():
+    return current_app.extensions['broker']
+
+
+def publish_event(user_id, event_type, data):
+    """
+    给某个用户推送一条事件，event_type:
+        'message'  收到新私信
+        'order'    订单被接单 / 完成 / 评价
+        'points'   积分变化
+        'read'     对方已读了我发的消息
+    """
+    if user_id is None:
+        return
+    get_broker().publish(f"user:{int(user_id)}", {"type": event_type, "data": data})
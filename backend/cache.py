@@ -0,0 +1,87 @@
+"""
+缓存相关
+
+TTLCache 是进程内缓存，多进程部署时每个进程各自一份，只用来放过期一会儿也没关系的数据 (热门标签)。
+写接口在修改数据后主动 clear()，TTL 只是兜底，防止漏掉的改动一直不生效。
+
+ETag 依赖的资源版本号 (ResourceVersions) 过期了会让客户端一直看到旧数据，所以放在数据库里，各进程共用。
+"""
+import threading
+import time
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import ResourceVersion
+
+
+class TTLCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = {}  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key, loader):
+        """命中且未过期直接返回，否则调用 loader() 重新加载"""
+        now = time.monotonic()
+        entry = self._data.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        # 同一时间只让一个请求去查库，其余的等它算完直接用结果
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            value = loader()
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# 首页热门标签: 发布/接单/完成/删除时失效
+hot_tags_cache = TTLCache(ttl=60)
+
+
+class ResourceVersions:
+    """
+    资源版本号: 每次写操作给受影响的资源 +1，读接口用它生成 ETag
+    存在数据库的 resource_versions 表里，多进程部署 (gunicorn 多个 worker) 时所有进程看到的是同一份:
+    进程 A 写了数据，进程 B 收到旧的 If-None-Match 也不会再回 304
+    """
+
+    def bump(self, *keys):
+        """
+        给 keys 的版本号 +1，和数据的修改放在同一个事务里 (调用方负责 commit)
+        提交前其他请求看到的还是旧版本号 + 旧数据，提交后一起变，不会把旧数据缓存到新 ETag 下
+        """
+        # 固定顺序加行锁，并发写同一批资源时不会互相死锁
+        for key in sorted(set(keys)):
+            updated = ResourceVersion.query.filter_by(key=key) \
+                .update({ResourceVersion.version: ResourceVersion.version + 1}, synchronize_session=False)
+            if updated:
+                continue
+            # 第一次写这个资源。并发时另一边可能已经插入了，冲突后改走更新
+            try:
+                with db.session.begin_nested():
+                    db.session.add(ResourceVersion(key=key, version=1))
+            except IntegrityError:
+                ResourceVersion.query.filter_by(key=key) \
+                    .update({ResourceVersion.version: ResourceVersion.version + 1}, synchronize_session=False)
+
+    def get_many(self, keys):
+        """一次查出 keys 的版本号 (主键查找)，没写过的资源是 0"""
+        versions = dict(db.session.query(ResourceVersion.key, ResourceVersion.version)
+                        .filter(ResourceVersion.key.in_(keys)))
+        return {key: versions.get(key, 0) for key in keys}
+
+
+# key 约定:
+#   'skills' / 'lost'       首页列表
+#   'users'                 任意用户改名 (列表和互助记录里都带用户名)
+#   'user:<id>'             个人信息 (积分、发布数)
+#   'helps:<id>'            我参与的互助
+#   'messages:<会话key>'     两人之间的聊天记录
+#   'inbox:<id>'            某人的会话列表 (最后一条消息、未读数)
+resource_versions = ResourceVersions()
@@ -0,0 +1,49 @@
+"""
+响应压缩 (gzip / deflate)
+
+列表接口返回的是大量重复结构的中文 JSON，压缩率很高。
+根据 Accept-Encoding 协商编码，小于 COMPRESS_MIN_SIZE 的响应不压缩 (省 CPU)。
+"""
+import gzip
+import zlib
+from flask import request
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+SUPPORTED_ENCODINGS = ['gzip', 'deflate']
+
+
+def compress_body(data, encoding, level):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return zlib.compress(data, level)
+
+
+def init_compression(app):
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)  # 字节
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+
+    @app.after_request
+    def compress_response(resp):
+        if (resp.status_code != 200
+                or resp.direct_passthrough  # 文件 / 流式响应不在这里处理
+                or 'Content-Encoding' in resp.headers
+                or resp.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return resp
+
+        resp.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(SUPPORTED_ENCODINGS)
+        if not encoding:
+            return resp
+
+        data = resp.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return resp
+
+        resp.set_data(compress_body(data, encoding, app.config['COMPRESS_LEVEL']))
+        resp.headers['Content-Encoding'] = encoding
+
+        # 同一资源的不同编码是不同的表示，强 ETag 要区分开
+        etag, weak = resp.get_etag()
+        if etag:
+            resp.set_etag(f"{etag}-{encoding}", weak)
+        return resp
@@ -0,0 +1,154 @@
+"""
+私信会话列表 (收件箱)
+
+conversations 表按无序用户对每个会话存一行 (user_a 是 id 较小的一方)，
+冗余保存最后一条消息的预览、时间和双方各自的未读数。
+send_message 在同一个事务里更新这一行，收件箱查询就只是
+(user_a, last_time) / (user_b, last_time) 两个索引上的范围扫描，
+不用再对整个 messages 表 GROUP BY。
+
+已读状态用水位表示: read_a / read_b 是双方各自读到的最后一条消息 id，
+标记已读只是推进水位、清零未读数，积压多少条消息都只改这一行。
+"""
+from sqlalchemy import String, case, cast, func
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Conversation, Message
+from utils import conversation_key
+
+PREVIEW_LENGTH = 50
+
+
+def message_preview(content):
+    """收件箱里显示的摘要: 图片消息显示 [图片]，文字截断到 PREVIEW_LENGTH"""
+    if content.startswith("image:"):
+        return "[图片]"
+    return content[:PREVIEW_LENGTH]
+
+
+def _last_message_values(msg):
+    return {
+        "last_message_id": msg.id,
+        "last_sender_id": msg.sender_id,
+        "last_preview": message_preview(msg.content),
+        "last_time": msg.create_time,
+    }
+
+
+def record_message(msg):
+    """
+    把一条新消息记到所属会话上，接收方未读数 +1
+    调用方需先 flush (拿到 msg.id)，并负责 commit，和消息写入在同一事务里
+    """
+    lo, hi = sorted((int(msg.sender_id), int(msg.receiver_id)))
+    key = conversation_key(lo, hi)
+    unread = 'unread_b' if int(msg.receiver_id) == hi else 'unread_a'
+    values = _last_message_values(msg)
+
+    # 未读数用 SQL 自增，并发发送时不会丢计数
+    updated = Conversation.query.filter_by(conversation_key=key).update(
+        {**values, unread: getattr(Conversation, unread) + 1}, synchronize_session=False)
+    if updated:
+        return
+
+    # 两人第一次聊天: 新建会话。双方同时发第一条时另一边可能已经插入了，冲突后改走更新
+    try:
+        with db.session.begin_nested():
+            db.session.add(Conversation(conversation_key=key, user_a=lo, user_b=hi, read_a=0, read_b=0,
+                                        **{"unread_a": 0, "unread_b": 0, **values, unread: 1}))
+    except IntegrityError:
+        Conversation.query.filter_by(conversation_key=key).update(
+            {**values, unread: getattr(Conversation, unread) + 1}, synchronize_session=False)
+
+
+def _sides(user_id, partner_id):
+    """返回 (会话 key, 我这一侧的后缀, 对方那一侧的后缀)"""
+    me = 'a' if int(user_id) <= int(partner_id) else 'b'
+    return conversation_key(user_id, partner_id), me, 'b' if me == 'a' else 'a'
+
+
+def read_marks(user_id, partner_id):
+    """返回 (我的已读水位, 对方的已读水位)，还没聊过天时都是 0"""
+    key, me, other = _sides(user_id, partner_id)
+    conv = Conversation.query.filter_by(conversation_key=key).first()
+    if conv is None:
+        return 0, 0
+    return getattr(conv, f'read_{me}') or 0, getattr(conv, f'read_{other}') or 0
+
+
+def mark_read(user_id, partner_id, upto=None):
+    """
+    把 user_id 在这个会话里的已读水位推进到 upto (不传则读到最后一条)，返回新的水位
+    调用方负责 commit
+    """
+    key, me, _ = _sides(user_id, partner_id)
+    conv = Conversation.query.filter_by(conversation_key=key).with_for_update().first()
+    if conv is None:
+        return 0
+
+    last_id = conv.last_message_id or 0
+    upto = last_id if upto is None else min(int(upto), last_id)
+    current = getattr(conv, f'read_{me}') or 0
+    if upto <= current:
+        return current  # 水位只前进不后退
+
+    if upto >= last_id:
+        unread = 0
+    else:
+        # 只读到中间某条: 数一下水位之后对方发来的消息 (走 (sender_id, receiver_id, id) 索引的范围扫描)
+        unread = Message.query.filter(Message.sender_id == partner_id, Message.receiver_id == user_id,
+                                      Message.id > upto).count()
+    setattr(conv, f'read_{me}', upto)
+    setattr(conv, f'unread_{me}', unread)
+    return upto
+
+
+def backfill_message_keys(batch_size=10000):
+    """给还没有 conversation_key 的老消息补上 (按 id 分段更新，避免一次锁住整张表)"""
+    lo = case((Message.sender_id < Message.receiver_id, Message.sender_id), else_=Message.receiver_id)
+    hi = case((Message.sender_id < Message.receiver_id, Message.receiver_id), else_=Message.sender_id)
+    key_expr = cast(lo, String) + '_' + cast(hi, String)
+
+    max_id = db.session.query(func.max(Message.id)).scalar() or 0
+    for start in range(0, max_id, batch_size):
+        Message.query.filter(Message.id > start, Message.id <= start + batch_size,
+                             Message.conversation_key.is_(None)) \
+            .update({Message.conversation_key: key_expr}, synchronize_session=False)
+        db.session.commit()
+
+
+def rebuild_conversations():
+    """
+    根据 messages 表重建全部会话 (给已有聊天记录补建收件箱时使用)
+    以前没有已读状态，历史消息一律视为已读，未读数从 0 开始
+    """
+    Conversation.query.delete()
+    last_ids = [row[0] for row in
+                db.session.query(func.max(Message.id)).group_by(Message.conversation_key)]
+
+    for i in range(0, len(last_ids), 500):
+        batch = Message.query.filter(Message.id.in_(last_ids[i:i + 500])).all()
+        db.session.bulk_insert_mappings(Conversation, [
+            {
+                "conversation_key": conversation_key(m.sender_id, m.receiver_id),
+                "user_a": min(m.sender_id, m.receiver_id),
+                "user_b": max(m.sender_id, m.receiver_id),
+                "unread_a": 0,
+                "unread_b": 0,
+                "read_a": m.id,
+                "read_b": m.id,
+                **_last_message_values(m),
+            }
+            for m in batch
+        ])
+        db.session.commit()
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    with create_app().app_context():
+        db.create_all()
+        rebuild_conversations()
+        print(">>> 会话列表重建完成")
@@ -0,0 +1,97 @@
+"""
+检查各个接口的 SQL 是否用上了对应的索引
+
+做法: 用 test_client 真实请求一遍接口，记录期间执行的 SELECT，
+再对每条语句跑 EXPLAIN，看 key 列 (SQLite 下是 QUERY PLAN) 里有没有期望的索引。
+
+注意: 表里只有几行数据时 MySQL 可能觉得全表扫描更快而不走索引，
+请在有一定数据量的库上运行。
+
+用法: python explain_check.py <user_id> <partner_id>
+"""
+import re
+import sys
+from sqlalchemy import event
+from extensions import db
+from utils import conversation_key
+import archive
+
+# (接口, 涉及的表, 期望用到的索引)
+CHECKS = [
+    ("/api/skills", "skills", {"ix_skills_status_time"}),
+    ("/api/skills?type=1", "skills", {"ix_skills_status_type_time"}),
+    ("/api/lost-items", "lost_items", {"ix_lost_items_status_time"}),
+    ("/api/lost-items?type=1", "lost_items", {"ix_lost_items_status_type_time"}),
+    ("/api/user/posts/{user_id}", "skills", {"ix_skills_user_status"}),
+    ("/api/user/posts/{user_id}", "lost_items", {"ix_lost_items_user_status"}),
+    ("/api/user/helps/{user_id}", "skills", {"ix_skills_helper", "ix_skills_user_status"}),
+    ("/api/user/helps/{user_id}", "lost_items", {"ix_lost_items_helper", "ix_lost_items_user_status"}),
+    ("/api/messages?user_id={user_id}&partner_id={partner_id}", "messages", {"ix_messages_conversation"}),
+    ("/api/messages?user_id={user_id}&partner_id={partner_id}&before_id=1000000000", "messages",
+     {"ix_messages_conversation"}),
+    # 轮询时 since_id 是最新的一条，不会落到归档范围里
+    ("/api/messages?user_id={user_id}&partner_id={partner_id}&since_id=1000000000", "messages",
+     {"ix_messages_conversation"}),
+    # before_id=1 一定翻过了热表，会继续查归档表 (只有这个会话归档过才会查，没归档过时跳过这一项)
+    ("/api/messages?user_id={user_id}&partner_id={partner_id}&before_id=1", "messages_archive",
+     {"ix_messages_archive_conversation"}),
+    ("/api/conversations?user_id={user_id}", "conversations",
+     {"ix_conversations_a_time", "ix_conversations_b_time"}),
+]
+
+_SQLITE_INDEX_RE = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+
+
+def capture_selects(client, url):
+    """请求一次接口，返回期间执行的 (sql, params) 列表"""
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", on_execute)
+    try:
+        client.get(url)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", on_execute)
+    return statements
+
+
+def used_indexes(statement, parameters):
+    """对一条语句跑 EXPLAIN，返回用到的索引名集合"""
+    with db.engine.connect() as conn:
+        if db.engine.name == "mysql":
+            rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).mappings().all()
+            return {name for row in rows if row["key"] for name in row["key"].split(",")}
+
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        return {name for row in rows for name in _SQLITE_INDEX_RE.findall(row[-1])}
+
+
+def run_checks(app, user_id, partner_id):
+    client = app.test_client()
+    failed = 0
+    with app.app_context():
+        for url, table, expected in CHECKS:
+            url = url.format(user_id=user_id, partner_id=partner_id)
+            if table == "messages_archive" and not archive.archived_max_id(conversation_key(user_id, partner_id)):
+                print(f"[SKIP] {url} ({table}): 这个会话没有归档过的消息，接口不会查归档表")
+                continue
+            used = set()
+            for statement, parameters in capture_selects(client, url):
+                if f"FROM {table}" in statement or f"JOIN {table}" in statement:
+                    used |= used_indexes(statement, parameters)
+
+            ok = expected <= used
+            failed += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] {url} ({table}): 期望 {sorted(expected)}, 实际 {sorted(used)}")
+    return failed
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    uid = sys.argv[1] if len(sys.argv) > 1 else 1
+    pid = sys.argv[2] if len(sys.argv) > 2 else 2
+    sys.exit(1 if run_checks(create_app(), uid, pid) else 0)
@@ -0,0 +1,47 @@
+"""
+条件请求 (ETag / If-None-Match)
+
+读接口用 @conditional 包一层: 根据资源版本号 + 请求参数算出 ETag，
+和客户端带来的 If-None-Match 一致就直接返回 304，只查一次版本号表 (主键查找)，不跑接口本身的查询。
+"""
+import hashlib
+from functools import wraps
+from flask import request, make_response
+from cache import resource_versions
+from compression import SUPPORTED_ENCODINGS
+
+
+def compute_etag(keys):
+    versions = resource_versions.get_many(keys)
+    raw = "|".join([request.full_path] + [f"{k}={versions[k]}" for k in keys])
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def conditional(resource_keys):
+    """
+    resource_keys: 接收视图参数、返回该接口依赖的资源 key 列表的函数
+    返回 None 表示这次请求不做缓存 (例如参数不全)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            keys = resource_keys(**kwargs)
+            if keys is None:
+                return view(*args, **kwargs)
+
+            etag = compute_etag(keys)
+            # 压缩后的响应 ETag 会带上编码后缀 (见 compression.py)，这里一并识别
+            for candidate in [etag] + [f"{etag}-{enc}" for enc in SUPPORTED_ENCODINGS]:
+                if request.if_none_match.contains_weak(candidate):
+                    resp = make_response("", 304)
+                    resp.set_etag(candidate)
+                    return resp
+
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code == 200:
+                resp.set_etag(etag)
+                # 允许客户端缓存，但每次使用前都要带 If-None-Match 回来确认
+                resp.headers['Cache-Control'] = 'no-cache'
+            return resp
+        return wrapper
+    return decorator
@@ -1,6 +1,7 @@
 from app import create_app
 from extensions import db
 from models import User, LostItem, Skill
+from search import rebuild_index
 
 app = create_app()
 
@@ -25,6 +26,9 @@ def init_database():
 
         db.session.add_all([l1, l2, s1, s2])
         db.session.commit()
+
+        # 4. 建立搜索索引
+        rebuild_index()
         print(">>> 数据库初始化完成")
 
 if __name__ == '__main__':
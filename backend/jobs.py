@@ -0,0 +1,165 @@
+"""
+本地后台任务队列
+
+上传图片后的缩略图、常用尺寸的变体等耗 CPU 的活不在请求里做:
+接口把原图存好、往 jobs 表里插一条任务就返回，后台 worker 再去生成并回填到帖子 / 头像上。
+
+- 任务存在数据库里，和业务数据在同一个事务提交，服务重启不丢
+- worker 是 Web 进程里的 JOBS_WORKERS 个后台线程，真正耗 CPU 的缩放 / 转码交给 thumbnails 的进程池
+- 领取任务时写一个租约 (locked_until)，worker 挂掉后租约过期，任务会被重新领取
+- 失败按 RETRY_DELAY * 2^(n-1) 秒退避重试，超过 max_attempts 次标记为 failed
+- JOBS_SYNC = True 时 (测试用) enqueue 直接在当前事务里执行，不经过 worker
+
+处理函数用 @task('名字') 注册，参数就是 enqueue 时给的关键字参数 (要能 JSON 序列化)，
+里面不要 commit，由执行方统一提交。
+"""
+import json
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, event, or_
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Job
+
+# 执行中的任务超过这么久还没结束，认为 worker 已经挂了
+JOB_LEASE = timedelta(minutes=5)
+# 第 n 次失败后等 RETRY_DELAY * 2^(n-1) 秒再试
+RETRY_DELAY = 5
+# 完成的任务保留几天
+KEEP_DONE_DAYS = 7
+
+_handlers = {}
+_wakeup = threading.Event()  # 有新任务提交时叫醒空闲的 worker，不用等到下一次轮询
+
+
+def task(kind):
+    """注册任务处理函数"""
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, max_attempts=3, **payload):
+    """
+    新建一个任务，返回 Job (调用方负责 commit，提交之后 worker 才看得到)
+    JOBS_SYNC 模式下直接执行完，返回的 Job 已经是 done / failed
+    """
+    job = Job(kind=kind, payload=json.dumps(payload), max_attempts=max_attempts, attempts=0)
+    db.session.add(job)
+    db.session.flush()
+    if current_app.config.get('JOBS_SYNC'):
+        job.attempts = 1
+        _execute(job)
+    else:
+        db.session.info['jobs_enqueued'] = True
+    return job
+
+
+def _execute(job):
+    """执行一个任务并记录结果；处理函数的改动放在 savepoint 里，失败时只回滚它自己的"""
+    try:
+        with db.session.begin_nested():
+            _handlers[job.kind](**json.loads(job.payload))
+        job.status, job.last_error = 'done', None
+    except Exception:
+        job.last_error = traceback.format_exc(limit=5)[-2000:]
+        if job.attempts >= job.max_attempts or current_app.config.get('JOBS_SYNC'):
+            job.status = 'failed'
+        else:
+            job.status = 'pending'
+            job.run_after = datetime.now() + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+        print(f"Job {job.id} ({job.kind}) failed: {job.last_error.strip().splitlines()[-1]}")
+    job.locked_until = None
+
+
+def _claimable(now):
+    return or_(and_(Job.status == 'pending', Job.run_after <= now),
+               and_(Job.status == 'running', Job.locked_until < now))
+
+
+def claim():
+    """领取一个可以执行的任务 (条件更新，多个 worker 并发领取时只有一个能成功)，没有任务返回 None"""
+    now = datetime.now()
+    candidates = [row[0] for row in db.session.query(Job.id).filter(_claimable(now))
+                  .order_by(Job.id).limit(10)]
+    for job_id in candidates:
+        claimed = Job.query.filter(Job.id == job_id, _claimable(now)).update(
+            {Job.status: 'running', Job.locked_until: now + JOB_LEASE, Job.attempts: Job.attempts + 1},
+            synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def run_one():
+    """领取并执行一个任务，没有可执行的任务时返回 False"""
+    job = claim()
+    if job is None:
+        return False
+    if job.attempts > job.max_attempts:
+        # 租约过期被重新领取 (worker 在执行中挂掉) 的次数也算在内
+        job.status, job.locked_until = 'failed', None
+        job.last_error = job.last_error or "执行超时"
+    else:
+        _execute(job)
+    db.session.commit()
+    return True
+
+
+def purge_jobs(days=KEEP_DONE_DAYS):
+    """删掉 days 天以前已经完成的任务，返回删除的条数 (失败的留着排查)"""
+    cutoff = datetime.now() - timedelta(days=days)
+    deleted = Job.query.filter(Job.status == 'done', Job.update_time < cutoff) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def run_worker(app, purge=False):
+    """worker 主循环: 有任务就一直做，做完了等新任务提交或者轮询间隔到了再看"""
+    last_purge = 0
+    while True:
+        try:
+            with app.app_context():
+                while run_one():
+                    pass
+                if purge and time.monotonic() - last_purge > 3600:
+                    purge_jobs()
+                    last_purge = time.monotonic()
+        except Exception as e:
+            print(f"Job worker error: {e}")
+        _wakeup.wait(app.config['JOBS_POLL_INTERVAL'])
+        _wakeup.clear()
+
+
+def init_jobs(app):
+    """
+    在 Web 进程里启动 JOBS_WORKERS 个 worker 线程
+    默认是 0 不启动: 只有服务入口 (python app.py，或部署时设置环境变量 JOBS_WORKERS) 才打开，
+    迁移、检查之类调用 create_app() 的脚本不会起 worker 去领任务。JOBS_SYNC 模式下也不启动
+    """
+    app.config.setdefault('JOBS_SYNC', False)
+    app.config.setdefault('JOBS_WORKERS', 0)
+    app.config.setdefault('JOBS_POLL_INTERVAL', 5)
+    if app.config['JOBS_SYNC'] or not app.config['JOBS_WORKERS'] or app.testing:
+        return
+    for i in range(app.config['JOBS_WORKERS']):
+        threading.Thread(target=run_worker, args=(app, i == 0), daemon=True, name=f'job-worker-{i}').start()
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('jobs_enqueued', False):
+        _wakeup.set()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_pending(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('jobs_enqueued', None)
+
@@ -0,0 +1,43 @@
+"""
+更快的 JSON 序列化
+
+装了 orjson 就用 orjson (比标准库 json 快很多)，没装就退回 Flask 默认实现。
+输出格式和默认实现保持一致: 中文不转义、按 key 排序、日期等类型交给 default() 处理。
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 可选依赖: pip install orjson
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def _orjson_options(self, pretty=False):
+        # datetime / dataclass 交给 default() 处理，和 Flask 默认的输出格式一致
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS \
+            | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        body = orjson.dumps(obj, default=self.default, option=self._orjson_options(pretty))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
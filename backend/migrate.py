@@ -0,0 +1,135 @@
+"""
+已有数据库的升级脚本
+
+init_db.py 会清空重建所有表，线上已有数据的 campus_market 库不能这么做。
+这个脚本只做增量修改: 建新表、补列、补索引、删掉被替换的旧索引，每一步都会先检查是否已经存在，可以重复执行。
+
+用法: python migrate.py            # 执行升级
+      python migrate.py --dry-run  # 只打印将要执行的 SQL
+"""
+import sys
+from sqlalchemy import Index, MetaData, Table, inspect
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable, DropIndex
+from extensions import db
+import models
+import search
+import conversations
+import archive
+
+# 模型里新增的列和 __table_args__ 里声明的索引都会被补建，这里只需列出表
+MIGRATED_MODELS = [models.User, models.Message, models.LostItem, models.Skill, models.SearchToken,
+                   models.Conversation, models.MessageArchive, models.Blob, models.UploadSession, models.Job,
+                   models.ResourceVersion]
+
+# 已被新索引取代、需要删掉的旧索引: {表名: [索引名]}
+DROPPED_INDEXES = {
+    'messages': ['ix_messages_pair'],  # -> ix_messages_pair_id (按 id 翻页)
+}
+
+
+def _run(ddl, dry_run):
+    """执行一条 DDL (SQLAlchemy 的 DDL 对象或拼好的 SQL 字符串)"""
+    sql = ddl if isinstance(ddl, str) else str(ddl.compile(dialect=db.engine.dialect)).strip()
+    print(f"{sql};")
+    if not dry_run:
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(sql)
+
+
+def ensure_columns(model, dry_run=False):
+    """给已有的表补上模型里新增的列，返回补上的列 ('表名.列名' 的集合)"""
+    table = model.__table__
+    existing = {col['name'] for col in inspect(db.engine).get_columns(table.name)}
+    preparer = db.engine.dialect.identifier_preparer
+    added = set()
+    for column in table.columns:
+        if column.name not in existing:
+            spec = CreateColumn(column).compile(dialect=db.engine.dialect)
+            _run(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {spec}", dry_run)
+            added.add(f"{table.name}.{column.name}")
+    return added
+
+
+def ensure_indexes(model, dry_run=False):
+    """给已有的表补上模型里声明、但数据库里还没有的索引"""
+    table = model.__table__
+    existing = {ix['name'] for ix in inspect(db.engine).get_indexes(table.name)}
+    for index in sorted(table.indexes, key=lambda ix: ix.name):
+        if index.name not in existing:
+            _run(CreateIndex(index), dry_run)
+
+
+def drop_replaced_indexes(dry_run=False):
+    """删掉 DROPPED_INDEXES 里列出的、数据库里还存在的旧索引"""
+    for table_name, names in DROPPED_INDEXES.items():
+        # 用一张临时的空表对象生成 DROP INDEX，不能把旧索引挂到模型的表上 (否则 create_all 会去建它)
+        table = Table(table_name, MetaData())
+        existing = {ix['name'] for ix in inspect(db.engine).get_indexes(table_name)}
+        for name in names:
+            if name in existing:
+                _run(DropIndex(Index(name, _table=table)), dry_run)
+
+
+def migrate(dry_run=False):
+    existing_tables = set(inspect(db.engine).get_table_names())
+    added_columns = set()
+
+    for model in MIGRATED_MODELS:
+        table = model.__table__
+        if table.name not in existing_tables:
+            # 1. 新增的表 (连同它的索引一起创建)
+            _run(CreateTable(table), dry_run)
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                _run(CreateIndex(index), dry_run)
+        else:
+            # 2. 已有表上缺失的列
+            added_columns |= ensure_columns(model, dry_run)
+
+    # 3. 老消息补上会话 key (先回填再建索引，省得建好的索引跟着更新一遍)
+    if not dry_run and 'messages.conversation_key' in added_columns:
+        print("-- 回填消息的会话 key")
+        conversations.backfill_message_keys()
+
+    # 4. 已有表上缺失的索引，以及被替换掉的旧索引
+    for model in MIGRATED_MODELS:
+        if model.__tablename__ in existing_tables:
+            ensure_indexes(model, dry_run)
+    drop_replaced_indexes(dry_run)
+
+    # 5. 搜索索引表是新建的，需要把现有帖子灌进去
+    if not dry_run and models.SearchToken.__tablename__ not in existing_tables:
+        print("-- 重建搜索索引")
+        search.rebuild_index()
+
+    # 6. 会话表是新建的，根据已有聊天记录生成收件箱
+    if not dry_run and models.Conversation.__tablename__ not in existing_tables:
+        print("-- 重建会话列表")
+        conversations.rebuild_conversations()
+
+    # 7. 已读水位是后加的列: 以前没有已读状态，老会话视为已读到最后一条
+    if not dry_run and 'conversations.read_a' in added_columns:
+        print("-- 回填会话已读水位")
+        models.Conversation.query.update({
+            models.Conversation.read_a: models.Conversation.last_message_id,
+            models.Conversation.read_b: models.Conversation.last_message_id,
+        }, synchronize_session=False)
+        db.session.commit()
+
+    # 8. 会话的归档位置是后加的列: 按归档表里已有的消息回填
+    if not dry_run and 'conversations.archived_max_id' in added_columns:
+        print("-- 回填会话的归档位置")
+        archive.mark_archived()
+        db.session.commit()
+
+    # 9. 上传文件的最后登记时间是后加的列: 老记录按第一次存储的时间算
+    if not dry_run and 'blobs.update_time' in added_columns:
+        print("-- 回填上传文件的登记时间")
+        models.Blob.query.update({models.Blob.update_time: models.Blob.create_time}, synchronize_session=False)
+        db.session.commit()
+
+if __name__ == '__main__':
+    from app import create_app
+
+    with create_app().app_context():
+        migrate(dry_run='--dry-run' in sys.argv)
+        print(">>> 数据库升级完成")
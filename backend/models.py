@@ -11,6 +11,7 @@ class User(db.Model):
     contact = db.Column(db.String(100), nullable=False)
     points = db.Column(db.Integer, default=10)
     avatar = db.Column(db.String(500))
+    avatar_thumb = db.Column(db.String(500))  # 头像缩略图，没有时用原图
 
     skills = db.relationship('Skill', backref='author', lazy=True, foreign_keys='Skill.user_id')
     lost_items = db.relationship('LostItem', backref='author', lazy=True, foreign_keys='LostItem.user_id')
@@ -19,9 +20,18 @@ class User(db.Model):
 # --- 2. 消息表 ---
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # 聊天记录: WHERE conversation_key=? AND id < ? ORDER BY id DESC LIMIT n (单段范围扫描)
+        db.Index('ix_messages_conversation', 'conversation_key', 'id'),
+        # 单向查询: 对方发给我的、水位之后的消息 (部分已读时重算未读数)
+        db.Index('ix_messages_pair_id', 'sender_id', 'receiver_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # 所属会话，和 utils.conversation_key 一致: '小id_大id'，写入时计算
+    # (老数据由 migrate.py 回填，所以列本身允许为空)
+    conversation_key = db.Column(db.String(32))
     content = db.Column(db.String(500), nullable=False)
     create_time = db.Column(db.DateTime, default=datetime.now)
 
@@ -29,12 +39,23 @@ class Message(db.Model):
 # --- 3. 失物招领表 ---
 class LostItem(db.Model):
     __tablename__ = 'lost_items'
+    __table_args__ = (
+        # 首页列表: WHERE status=0 ORDER BY create_time DESC, id DESC (游标分页)
+        db.Index('ix_lost_items_status_time', 'status', 'create_time', 'id'),
+        # 按类型筛选: WHERE status=0 AND type=? ORDER BY create_time DESC, id DESC
+        db.Index('ix_lost_items_status_type_time', 'status', 'type', 'create_time', 'id'),
+        # 我的发布: WHERE user_id=?；我参与的互助: WHERE user_id=? AND status!=0
+        db.Index('ix_lost_items_user_status', 'user_id', 'status', 'create_time'),
+        # 我参与的互助: WHERE helper_id=?
+        db.Index('ix_lost_items_helper', 'helper_id', 'status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     desc = db.Column(db.Text)
     location = db.Column(db.String(100))
     type = db.Column(db.Integer, default=0)
     image = db.Column(db.String(500))
+    thumb = db.Column(db.String(500))  # 列表卡片用的缩略图，没有时用原图
     create_time = db.Column(db.DateTime, default=datetime.now)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
@@ -49,11 +70,18 @@ class LostItem(db.Model):
 # --- 4. 技能表 ---
 class Skill(db.Model):
     __tablename__ = 'skills'
+    __table_args__ = (
+        db.Index('ix_skills_status_time', 'status', 'create_time', 'id'),
+        db.Index('ix_skills_status_type_time', 'status', 'type', 'create_time', 'id'),
+        db.Index('ix_skills_user_status', 'user_id', 'status', 'create_time'),
+        db.Index('ix_skills_helper', 'helper_id', 'status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     cost = db.Column(db.String(100), nullable=False)
     type = db.Column(db.Integer, default=1)
     image = db.Column(db.String(500))
+    thumb = db.Column(db.String(500))
     create_time = db.Column(db.DateTime, default=datetime.now)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
@@ -62,4 +90,114 @@ class Skill(db.Model):
 
     # 【修改】拆分评价状态
     poster_review = db.Column(db.Integer, default=0)
-    helper_review = db.Column(db.Integer, default=0)
\ No newline at end of file
+    helper_review = db.Column(db.Integer, default=0)
+
+# --- 5. 搜索倒排索引表 (字符二元组 -> 帖子) ---
+class SearchToken(db.Model):
+    __tablename__ = 'search_tokens'
+    __table_args__ = (
+        # 按词项查倒排表: WHERE category=? AND token IN (...)，带上 item_id/weight 做覆盖索引
+        db.Index('ix_search_tokens_lookup', 'category', 'token', 'item_id', 'weight'),
+        # 删除/下架时按帖子清理
+        db.Index('ix_search_tokens_item', 'category', 'item_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(10), nullable=False)  # 'skill' 或 'lost'
+    token = db.Column(db.String(8), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
+    weight = db.Column(db.Integer, default=1)  # 词频 x 字段权重 (标题更重要)
+
+
+# --- 6. 会话表 (收件箱，每对用户一行，冗余最后一条消息和未读数) ---
+class Conversation(db.Model):
+    __tablename__ = 'conversations'
+    __table_args__ = (
+        # 收件箱: WHERE user_a=? ORDER BY last_time DESC (user_b 同理)
+        db.Index('ix_conversations_a_time', 'user_a', 'last_time', 'id'),
+        db.Index('ix_conversations_b_time', 'user_b', 'last_time', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    # 和 utils.conversation_key 一致: '小id_大id'
+    conversation_key = db.Column(db.String(32), nullable=False, unique=True)
+    user_a = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # id 较小的一方
+    user_b = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # id 较大的一方
+
+    last_message_id = db.Column(db.Integer)
+    last_sender_id = db.Column(db.Integer)
+    last_preview = db.Column(db.String(100))
+    last_time = db.Column(db.DateTime, default=datetime.now)
+
+    # 双方各自的未读数
+    unread_a = db.Column(db.Integer, default=0)
+    unread_b = db.Column(db.Integer, default=0)
+
+    # 已读水位: 各自读到的最后一条消息 id，id 不大于它的消息都算已读
+    read_a = db.Column(db.Integer, default=0)
+    read_b = db.Column(db.Integer, default=0)
+
+    # 归档表里这个会话最大的消息 id，从没归档过时为空 (翻页时据此判断要不要查归档表)
+    archived_max_id = db.Column(db.Integer)
+
+
+# --- 7. 消息归档表 (冷数据，结构和 messages 一致，id 沿用原消息的 id) ---
+class MessageArchive(db.Model):
+    __tablename__ = 'messages_archive'
+    __table_args__ = (
+        db.Index('ix_messages_archive_conversation', 'conversation_key', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sender_id = db.Column(db.Integer, nullable=False)
+    receiver_id = db.Column(db.Integer, nullable=False)
+    conversation_key = db.Column(db.String(32))
+    content = db.Column(db.String(500), nullable=False)
+    create_time = db.Column(db.DateTime)
+
+
+# --- 8. 上传文件 (按内容寻址，同一张图只存一份) ---
+class Blob(db.Model):
+    __tablename__ = 'blobs'
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, unique=True)
+    path = db.Column(db.String(200), nullable=False)  # 相对 UPLOAD_FOLDER: ab/cd/<sha256>.<ext>
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)  # 被多少个帖子 / 头像 / 消息引用
+    create_time = db.Column(db.DateTime, default=datetime.now)
+    # 最后一次登记 / 认领的时间: 断点续传 finalize 后一直没人认领的文件按它过期
+    update_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+# --- 9. 断点续传的上传会话 (已收到的字节在 UPLOAD_FOLDER/.sessions/<id>.part，文件大小就是进度) ---
+class UploadSession(db.Model):
+    __tablename__ = 'upload_sessions'
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex，同时也是上传凭证
+    user_id = db.Column(db.Integer)
+    filename = db.Column(db.String(200))
+    size = db.Column(db.Integer, nullable=False)  # 声明的总大小
+    create_time = db.Column(db.DateTime, default=datetime.now)
+
+
+# --- 10. 后台任务队列 (上传后的缩略图 / 变体生成等，见 jobs.py) ---
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # 取任务: WHERE status = 'pending' AND run_after <= now ORDER BY id
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON 参数
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending / running / done / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    last_error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, default=datetime.now)  # 重试时往后推
+    locked_until = db.Column(db.DateTime)  # 执行中的租约，过期说明 worker 挂了，可以被别人重新领取
+    create_time = db.Column(db.DateTime, default=datetime.now)
+    update_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+# --- 11. 资源版本号 (读接口的 ETag 用，见 cache.ResourceVersions) ---
+class ResourceVersion(db.Model):
+    __tablename__ = 'resource_versions'
+    key = db.Column(db.String(64), primary_key=True)  # 'skills' / 'user:<id>' / 'messages:<会话key>' ...
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,42 @@
+"""
+进程内通知器: 让等待新消息的请求挂起，有新消息时立即唤醒
+
+用法:
+    with message_notifier.listen(key) as event:
+        ... 先查一次数据库，没有新数据再 event.wait(timeout)
+
+先登记再查库，查库和开始等待之间到达的通知也不会丢。
+"""
+import threading
+from contextlib import contextmanager
+
+
+class Notifier:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}  # key -> {threading.Event}
+
+    @contextmanager
+    def listen(self, key):
+        event = threading.Event()
+        with self._lock:
+            self._waiters.setdefault(key, set()).add(event)
+        try:
+            yield event
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(event)
+                    if not waiters:
+                        del self._waiters[key]
+
+    def notify(self, key):
+        with self._lock:
+            events = list(self._waiters.get(key, ()))
+        for event in events:
+            event.set()
+
+
+# key 为 conversation_key(a, b)，send_message 提交后通知
+message_notifier = Notifier()
@@ -1 +1 @@
-from . import auth, skills, lost_items, messages
\ No newline at end of file
+from . import auth, skills, lost_items, messages, realtime, upload_sessions, media, jobs
\ No newline at end of file
@@ -1,7 +1,10 @@
 from flask import Blueprint, jsonify, request
 from extensions import db
 from models import User, Skill, LostItem
-from utils import save_uploaded_file # 记得导入这个工具
+from utils import save_uploaded_file, claim_uploaded_file, process_image_later, release_uploaded_file, parse_fields, select_columns, pack_row # 记得导入这个工具
+import search
+from cache import hot_tags_cache, resource_versions
+from http_cache import conditional
 
 bp = Blueprint('auth', __name__)
 
@@ -22,12 +25,14 @@ def login():
     return jsonify({"code": 401, "msg": "账号或密码错误"}), 401
 
 @bp.route('/user/<int:user_id>', methods=['GET'])
+@conditional(lambda user_id: [f'user:{user_id}'])
 def get_user_info(user_id):
     user = User.query.get(user_id)
     if not user: return jsonify({"code": 404, "msg": "用户不存在"}), 404
     skills_count = Skill.query.filter_by(user_id=user.id).count()
     lost_count = LostItem.query.filter_by(user_id=user.id).count()
     avatar_url = user.avatar if user.avatar else f"https://ui-avatars.com/api/?name={user.username}&background=random"
+    avatar_thumb = user.avatar_thumb or avatar_url
 
     return jsonify({
         "code": 200,
@@ -37,6 +42,7 @@ def get_user_info(user_id):
             "contact": user.contact,
             "points": user.points,
             "avatar": avatar_url,  # 使用处理后的 URL
+            "avatar_thumb": avatar_thumb,  # 个人页的小头像用这个
             "stats": {"posts": skills_count + lost_count, "skills": skills_count, "lost": lost_count}
         }
     })
@@ -57,38 +63,82 @@ def update_user():
         if not user: return jsonify({"code": 404, "msg": "用户不存在"}), 404
 
         # 2. 更新文本信息
+        renamed = bool(data.get('username')) and data.get('username') != user.username
         if data.get('username'): user.username = data.get('username')
         if data.get('contact'): user.contact = data.get('contact')
 
         # 3. 【新增】更新头像
         avatar_file = request.files.get('avatar')
-        if avatar_file:
-            url = save_uploaded_file(avatar_file)
-            user.avatar = url
+        avatar_url = data.get('avatar_url')  # 或者先通过断点续传接口传好，这里只给 URL
+        if avatar_file or avatar_url:
+            old_avatar = user.avatar
+            user.avatar = claim_uploaded_file(avatar_url) if avatar_url else save_uploaded_file(avatar_file)
+            release_uploaded_file(old_avatar)  # 旧头像没人用了就删掉
+            process_image_later(user.avatar, user)  # 小头像由后台任务生成
 
+        resource_versions.bump(f'user:{user.id}')
+        if renamed or avatar_file or avatar_url:
+            # 列表和互助记录里都显示了用户名，会话列表里还有对方头像
+            resource_versions.bump('users')
         db.session.commit()
         return jsonify({"code": 200, "msg": "修改成功"})
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
     except Exception as e:
         print(e)
         return jsonify({"code": 500, "msg": str(e)}), 500
 
+def _post_fields(model, category):
+    """我的发布: 技能和失物输出同样的 key，只是 tag / info 取自不同的列"""
+    if category == "skill":
+        tag = lambda r: "提供" if r.type == 1 else "求助"
+        color = lambda r: "blue" if r.type == 1 else "orange"
+        info_col = model.cost
+    else:
+        tag = lambda r: "捡到" if r.type == 1 else "丢失"
+        color = lambda r: "green" if r.type == 1 else "red"
+        info_col = model.location
+    return {
+        "id": ([model.id], lambda r: r.id),
+        "category": ([], lambda r: category),
+        "title": ([model.title], lambda r: r.title),
+        "tag": ([model.type], tag),
+        "color": ([model.type], color),
+        "image": ([model.image], lambda r: r.image),
+        "thumb": ([model.thumb, model.image], lambda r: r.thumb or r.image),
+        "info": ([info_col.label('info')], lambda r: r.info),
+        "status": ([model.status], lambda r: r.status),
+        "create_time": ([model.create_time], lambda r: r.create_time.strftime("%m-%d")),
+    }
+
 @bp.route('/user/posts/<int:user_id>', methods=['GET'])
 def get_user_posts(user_id):
-    skills = Skill.query.filter_by(user_id=user_id).all()
-    losts = LostItem.query.filter_by(user_id=user_id).all()
-    data = []
-    for s in skills:
-        data.append({"id": s.id, "category": "skill", "title": s.title, "tag": "提供" if s.type==1 else "求助", "color": "blue" if s.type==1 else "orange", "image": s.image, "info": s.cost, "create_time": s.create_time.strftime("%m-%d")})
-    for l in losts:
-        data.append({"id": l.id, "category": "lost", "title": l.title, "tag": "捡到" if l.type==1 else "丢失", "color": "green" if l.type==1 else "red", "image": l.image, "info": l.location, "create_time": l.create_time.strftime("%m-%d")})
-    data.sort(key=lambda x: x['create_time'], reverse=True)
-    return jsonify({"code": 200, "data": data})
+    try:
+        rows = []
+        for model, category in [(Skill, "skill"), (LostItem, "lost")]:
+            spec = _post_fields(model, category)
+            fields = parse_fields(spec)
+            columns = select_columns(spec, fields, model.id, model.create_time)
+            for r in db.session.query(*columns).filter(model.user_id == user_id).all():
+                rows.append((r.create_time, r.id, pack_row(r, fields, spec)))
+
+        # 按真实时间排序 (不是格式化后的 "%m-%d" 字符串)
+        rows.sort(key=lambda x: (x[0], x[1]), reverse=True)
+        return jsonify({"code": 200, "data": [x[2] for x in rows]})
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
 
 @bp.route('/delete', methods=['POST'])
 def delete_post():
     data = request.get_json()
     item = Skill.query.get(data['id']) if data['category'] == 'skill' else LostItem.query.get(data['id'])
-    if item: db.session.delete(item); db.session.commit()
+    if item:
+        search.remove_item('skill' if data['category'] == 'skill' else 'lost', item.id)
+        release_uploaded_file(item.image)
+        resource_versions.bump('skills' if data['category'] == 'skill' else 'lost',
+                               f'user:{item.user_id}', f'helps:{item.user_id}', f'helps:{item.helper_id}')
+        db.session.delete(item); db.session.commit()
+        hot_tags_cache.clear()
     return jsonify({"code": 200, "msg": "删除成功"})
 
 @bp.route('/interact', methods=['POST'])
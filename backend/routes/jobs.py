@@ -0,0 +1,25 @@
+from flask import Blueprint, jsonify
+from extensions import db
+from models import Job
+
+bp = Blueprint('jobs', __name__)
+
+
+# --- 后台任务状态 (发布帖子 / 换头像后，缩略图等是异步生成的，客户端可以据此刷新) ---
+@bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({"code": 404, "msg": "任务不存在"}), 404
+    return jsonify({
+        "code": 200,
+        "data": {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,  # pending / running / done / failed
+            "attempts": job.attempts,
+            "error": job.last_error.strip().splitlines()[-1] if job.last_error else None,
+            "create_time": job.create_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "update_time": job.update_time.strftime("%Y-%m-%d %H:%M:%S") if job.update_time else None,
+        }
+    })
@@ -2,39 +2,66 @@ from flask import Blueprint, jsonify, request
 from sqlalchemy.sql.expression import func
 from extensions import db
 from models import LostItem, User
-from utils import save_uploaded_file
+from utils import save_uploaded_file, claim_uploaded_file, process_image_later, paginate_by_time, paginate_by_rank, parse_fields, select_columns, pack_row
+import search
+from cache import hot_tags_cache, resource_versions
+from http_cache import conditional
 
 # 注意：这里绝对不能有 from api_client import APIClient
 
 bp = Blueprint('lost_items', __name__)
 
 
+# 列表可输出的字段 (?fields=id,title,image 只返回其中一部分，desc 是 Text 列，卡片不需要时就不查)
+LOST_LIST_FIELDS = {
+    "id": ([LostItem.id], lambda r: r.id),
+    "title": ([LostItem.title], lambda r: r.title),
+    "desc": ([LostItem.desc], lambda r: r.desc),
+    "location": ([LostItem.location], lambda r: r.location),
+    "type": ([LostItem.type], lambda r: r.type),
+    "image": ([LostItem.image], lambda r: r.image),
+    "thumb": ([LostItem.thumb, LostItem.image], lambda r: r.thumb or r.image),  # 卡片用的小图
+    "time": ([LostItem.create_time], lambda r: r.create_time.strftime("%Y-%m-%d")),
+    "user": ([User.username.label('author_name')], lambda r: r.author_name or "未知用户"),
+    "user_id": ([LostItem.user_id], lambda r: r.user_id),
+}
+
+
 @bp.route('/lost-items', methods=['GET'])
+@conditional(lambda: ['lost', 'users'])
 def get_lost_items():
     try:
         item_type = request.args.get('type', type=int)
         keyword = request.args.get('keyword')
         location = request.args.get('location')
+        fields = parse_fields(LOST_LIST_FIELDS)
 
-        query = LostItem.query.filter_by(status=0)
+        # 只查需要的列，并且一次 JOIN 出作者名，避免逐行访问 item.author 产生 N+1 查询
+        query = db.session.query(
+            *select_columns(LOST_LIST_FIELDS, fields, LostItem.id, LostItem.create_time)
+        ).filter(LostItem.status == 0)
+        if "user" in fields:
+            query = query.outerjoin(User, User.id == LostItem.user_id)
         if item_type is not None:
-            query = query.filter_by(type=item_type)
-        if keyword:
-            query = query.filter(LostItem.title.contains(keyword) | LostItem.desc.contains(keyword))
+            query = query.filter(LostItem.type == item_type)
         if location:
             query = query.filter(LostItem.location.contains(location))
 
-        items = query.order_by(LostItem.create_time.desc()).all()
-        data = []
-        for item in items:
-            author_name = item.author.username if item.author else "未知用户"
-            data.append({
-                "id": item.id, "title": item.title, "desc": item.desc,
-                "location": item.location, "type": item.type, "image": item.image,
-                "time": item.create_time.strftime("%Y-%m-%d"),
-                "user": author_name, "user_id": item.user_id
-            })
-        return jsonify({"code": 200, "data": data})
+        if keyword:
+            # 走倒排索引，按相关度排序
+            ranked = search.ranked_subquery('lost', keyword)
+            if ranked is None:
+                return jsonify({"code": 200, "data": [], "next_cursor": None})
+            query = query.join(ranked, ranked.c.item_id == LostItem.id)
+            items, next_cursor = paginate_by_rank(query, ranked.c.score, LostItem.id)
+        else:
+            # 游标分页: ?limit=20&cursor=xxx
+            items, next_cursor = paginate_by_time(query, LostItem.create_time, LostItem.id)
+
+        data = [pack_row(item, fields, LOST_LIST_FIELDS) for item in items]
+        return jsonify({"code": 200, "data": data, "next_cursor": next_cursor})
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
     except Exception as e:
         return jsonify({"code": 500, "msg": str(e)}), 500
 
@@ -50,19 +77,31 @@ def create_lost_item():
         user_id = request.form.get('user_id', type=int)
 
         image_file = request.files.get('image')
-        image_url = save_uploaded_file(image_file)
+        if request.form.get('image_url'):
+            # 已经通过断点续传接口 (/api/uploads) 传好的图片
+            image_url = claim_uploaded_file(request.form.get('image_url'))
+        else:
+            image_url = save_uploaded_file(image_file)
 
         new_item = LostItem(
             title=title, desc=desc, location=location,
             type=type_val, image=image_url, user_id=user_id
         )
         db.session.add(new_item)
+        db.session.flush()
+        search.index_item('lost', new_item)
+        # 缩略图等由后台任务生成，原图存好就返回
+        job = process_image_later(image_url, new_item)
 
         # 【逻辑确认】根据你的要求，发布时不加分，统一在完成时结算
         # 所以这里不需要 user.points += ...
 
+        resource_versions.bump('lost', f'user:{user_id}')
         db.session.commit()
-        return jsonify({"code": 200, "msg": "发布成功"})
+        hot_tags_cache.clear()
+        return jsonify({"code": 200, "msg": "发布成功", "data": {"id": new_item.id, "job_id": job.id if job else None}})
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
     except Exception as e:
         return jsonify({"code": 500, "msg": str(e)}), 500
 
@@ -0,0 +1,205 @@
+"""
+上传图片的下载 (/media/<文件名>)
+
+原来图片走 Flask 的 static 路由，没有长缓存，每次刷新列表客户端都要再问一遍。
+上传文件按内容寻址 (文件名就是 sha256，缩略图由原图决定)，同一个 URL 的内容永远不会变，
+所以这里直接给一年的 immutable 缓存，ETag 用文件名里的哈希，支持 Range (断点下载 / 分段读取)。
+文件内容通过 wsgi.file_wrapper 交给服务器发送 (gunicorn 等会用 sendfile 零拷贝)。
+
+前面有 Nginx / Apache 时，可以让代理来发文件，Python 进程只回一个响应头:
+    MEDIA_ACCEL = 'nginx'    -> X-Accel-Redirect: MEDIA_ACCEL_PREFIX + 文件名
+    MEDIA_ACCEL = 'sendfile' -> X-Sendfile: 文件的绝对路径 (Apache mod_xsendfile / lighttpd)
+
+    # Nginx 配置示例
+    location /protected-media/ {
+        internal;
+        alias /path/to/backend/static/uploads/;
+    }
+
+?w=800 / ?fmt=webp 返回缩放、转码后的变体 (见 variants.py)。
+
+同一进程里同时在发的文件数不超过 MEDIA_MAX_CONCURRENCY，等着生成变体的请求数不超过 MEDIA_MAX_RENDERS，
+图片一窝蜂地加载时多出来的请求很快返回 503 (客户端稍后重试)，不会占满所有线程让 API 请求排队。
+"""
+import io
+import mimetypes
+import os
+import re
+import threading
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+import variants
+
+bp = Blueprint('media', __name__)
+
+# 一年，内容寻址的文件永远不会变
+MEDIA_MAX_AGE = 365 * 24 * 3600
+# 按内容寻址的文件名: ab/cd/<sha256>.<ext> 或 ab/cd/<sha256>_thumb.<ext>
+_HASHED_NAME = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64}(?:_thumb)?)\.[a-z]+$')
+
+_slots = {}
+_slots_lock = threading.Lock()
+
+
+def _get_slots(config_key, default):
+    """按配置项取 (第一次用到时创建) 一个并发名额的信号量"""
+    with _slots_lock:
+        if config_key not in _slots:
+            _slots[config_key] = threading.BoundedSemaphore(current_app.config.get(config_key, default))
+        return _slots[config_key]
+
+
+def _acquire(slots):
+    return slots.acquire(timeout=current_app.config.get('MEDIA_QUEUE_TIMEOUT', 0.5))
+
+
+def _busy():
+    resp = jsonify({"code": 503, "msg": "服务器繁忙，请稍后重试"})
+    resp.status_code = 503
+    resp.headers['Retry-After'] = '1'
+    return resp
+
+
+def _cache_headers(resp):
+    resp.cache_control.public = True
+    resp.cache_control.max_age = MEDIA_MAX_AGE
+    resp.cache_control.immutable = True
+    return resp
+
+
+def _accel_response(path, filename, mimetype):
+    """交给前置代理发送文件，这里只回响应头"""
+    resp = Response(mimetype=mimetype)
+    if current_app.config['MEDIA_ACCEL'] == 'nginx':
+        resp.headers['X-Accel-Redirect'] = current_app.config.get('MEDIA_ACCEL_PREFIX', '/protected-media/') + filename
+    else:
+        resp.headers['X-Sendfile'] = os.path.abspath(path)
+    return _cache_headers(resp)
+
+
+class _SlotFile(io.FileIO):
+    """发送中的文件: 服务器发完 / 客户端断开后关闭文件时，把并发名额还回去"""
+
+    def __init__(self, path, release):
+        super().__init__(path, 'rb')
+        self._release = release
+
+    def close(self):
+        if not self.closed:
+            self._release()
+        super().close()
+
+
+def _not_modified(etag):
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    return _cache_headers(resp)  # 304 没有文件内容要发，不占名额
+
+
+def _send(path, name, etag, mimetype):
+    """发送文件；文件不存在 (比如变体刚被 LRU 淘汰) 时抛出 FileNotFoundError，由调用方处理"""
+    if current_app.config.get('MEDIA_ACCEL'):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        return _accel_response(path, name, mimetype)
+
+    slots = _get_slots('MEDIA_MAX_CONCURRENCY', 8)
+    if not _acquire(slots):
+        return _busy()
+
+    # 先打开再取大小: 打开之后文件就算被删掉也能发完
+    try:
+        file = _SlotFile(path, slots.release)
+    except OSError:
+        slots.release()
+        raise
+    stat = os.fstat(file.fileno())
+    # 和 send_file 一样交给 wsgi.file_wrapper (gunicorn 会用 sendfile)，只是文件关闭时顺便释放名额
+    resp = Response(wrap_file(request.environ, file), mimetype=mimetype, direct_passthrough=True)
+    resp.content_length = stat.st_size
+    resp.last_modified = stat.st_mtime
+    resp.set_etag(etag)
+    _cache_headers(resp)
+    # 处理 If-Modified-Since 和 Range (206 / 416)
+    return resp.make_conditional(request.environ, accept_ranges=True, complete_length=stat.st_size)
+
+
+def _render_variant(folder, filename, width, out):
+    """
+    缓存没命中时生成变体。同时在等生成结果的请求不超过 MEDIA_MAX_RENDERS 个，
+    名额满了返回 False (503)，避免一批没缓存的 ?w= 请求占满所有线程
+    """
+    slots = _get_slots('MEDIA_MAX_RENDERS', 4)
+    if not _acquire(slots):
+        return False
+    try:
+        return variants.get_variant(folder, filename, width, out,
+                                    current_app.config.get('THUMB_WORKERS', 2),
+                                    cache_size=current_app.config.get('VARIANT_CACHE_SIZE', variants.VARIANT_CACHE_SIZE))
+    finally:
+        slots.release()
+
+
+def _send_variant(folder, filename, path, width, out, etag):
+    """发送变体，需要时先生成；没装 Pillow / 转码失败时退回原图"""
+    for _ in range(2):
+        name = variants.cached_variant(folder, filename, width, out)
+        if name is None:
+            name = _render_variant(folder, filename, width, out)
+            if name is False:
+                return _busy()
+        if name is None:
+            break
+        try:
+            return _send(os.path.join(folder, name), name, f"{etag}-w{width}.{out}", variants.mimetype(out))
+        except FileNotFoundError:
+            continue  # 刚好被 LRU 淘汰了，当作没命中再来一次
+    return _send(path, filename, etag, _guess_type(filename))
+
+
+def _guess_type(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+@bp.route('/<path:filename>', methods=['GET'])
+def get_media(filename):
+    # 断点续传的临时文件 (.sessions/...)、上传中的 .part 文件、变体缓存目录不能直接访问
+    if any(part.startswith('.') for part in filename.split('/')):
+        abort(404)
+    folder = current_app.config['UPLOAD_FOLDER']
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    # 按内容寻址的文件用哈希做 ETag (多台机器上也一致)，老文件按 mtime/大小算
+    hashed = _HASHED_NAME.match(filename)
+    if hashed:
+        etag = hashed.group(1)
+    else:
+        stat = os.stat(path)
+        etag = f"{int(stat.st_mtime)}-{stat.st_size}"
+
+    width = request.args.get('w', type=int)
+    fmt = request.args.get('fmt')
+    try:
+        if not (width or fmt):
+            if request.if_none_match.contains(etag):
+                return _not_modified(etag)
+            return _send(path, filename, etag, _guess_type(filename))
+
+        # ?w= / ?fmt=: 缩放 + 转码后的变体 (见 variants.py)
+        width = variants.variant_width(width or variants.VARIANT_WIDTHS[-1])
+        out = variants.negotiate_format(request.accept_mimetypes, filename.rsplit('.', 1)[-1].lower(), fmt)
+        if out is None:
+            return jsonify({"code": 400, "msg": f"不支持的图片格式: {fmt}"}), 400
+        variant_etag = f"{etag}-w{width}.{out}"
+        if request.if_none_match.contains(variant_etag):
+            resp = _not_modified(variant_etag)
+        else:
+            resp = _send_variant(folder, filename, path, width, out, etag)
+    except FileNotFoundError:
+        abort(404)  # 原图在检查之后被删掉了
+    if not fmt:
+        resp.vary.add('Accept')  # 格式是按 Accept 选的，代理缓存要按 Accept 区分
+    return resp
@@ -1,11 +1,20 @@
-from flask import Blueprint, jsonify, request
-from sqlalchemy import or_, and_
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import select, union_all
 from extensions import db
-from models import Message, User
-from utils import save_uploaded_file  # 【重要】记得导入这个
+from models import Message, User, Conversation
+from utils import save_uploaded_file, claim_uploaded_file, process_image_later, conversation_key, get_page_limit, paginate_by_time, MAX_PAGE_SIZE  # 【重要】记得导入这个
+from cache import resource_versions
+from http_cache import conditional
+from notifier import message_notifier
+from broker import publish_event
+import conversations
+import archive
 
 bp = Blueprint('messages', __name__)
 
+# 长轮询 / SSE 单次最长挂起时间 (秒)
+POLL_TIMEOUT = 25
+
 
 # --- 发送消息 (支持文本和图片) ---
 @bp.route('/messages', methods=['POST'])
@@ -16,14 +25,16 @@ def send_message():
         receiver_id = request.form.get('receiver_id')
         content = request.form.get('content')
         image_file = request.files.get('image')
+        image_url = request.form.get('image_url')  # 通过断点续传接口传好的图片
 
         if not sender_id or not receiver_id:
             return jsonify({"code": 400, "msg": "参数缺失"}), 400
 
         # 处理图片
-        if image_file:
-            # 保存图片并获取 URL
-            url = save_uploaded_file(image_file)
+        if image_url or image_file:
+            # 保存图片并获取 URL (或认领断点续传传好的图片)
+            url = claim_uploaded_file(image_url) if image_url else save_uploaded_file(image_file)
+            process_image_later(url)  # 聊天里显示的缩放图由后台任务预先生成
             # 使用特殊前缀标记这是图片
             final_content = f"image:{url}"
         else:
@@ -34,59 +45,233 @@ def send_message():
         new_msg = Message(
             sender_id=sender_id,
             receiver_id=receiver_id,
+            conversation_key=conversation_key(sender_id, receiver_id),
             content=final_content
         )
         db.session.add(new_msg)
+        db.session.flush()
+        conversations.record_message(new_msg)  # 收件箱和消息在同一事务里更新
+        key = conversation_key(sender_id, receiver_id)
+        resource_versions.bump(f'messages:{key}', f'inbox:{sender_id}', f'inbox:{receiver_id}')
         db.session.commit()
+        message_notifier.notify(key)  # 唤醒正在长轮询 / SSE 等待这个会话的请求
+        publish_event(receiver_id, 'message', {"id": new_msg.id, "sender_id": int(sender_id)})
         return jsonify({"code": 200, "msg": "发送成功"})
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
     except Exception as e:
         print(e)
         return jsonify({"code": 500, "msg": str(e)}), 500
 
 
+def _pack_message(m, user_id, marks):
+    # 判断这条消息是不是我发的
+    is_me = (str(m.sender_id) == str(user_id))
+    # marks = (我的已读水位, 对方的已读水位): 我发的看对方读没读，别人发的看我读没读
+    my_read, partner_read = marks
+
+    # 【新增】判断内容类型 (文本 vs 图片)
+    msg_type = "image" if m.content.startswith("image:") else "text"
+    # 如果是图片，去掉前缀只保留 URL
+    clean_content = m.content.replace("image:", "") if msg_type == "image" else m.content
+
+    return {
+        "id": m.id,
+        "type": msg_type,  # 告诉前端这是图片还是字
+        "content": clean_content,
+        "is_me": is_me,
+        "unread": m.id > (partner_read if is_me else my_read),
+        "time": m.create_time.strftime("%H:%M")
+    }
+
+
+def _messages_resource():
+    user_id = request.args.get('user_id', type=int)
+    partner_id = request.args.get('partner_id', type=int)
+    if user_id is None or partner_id is None:
+        return None
+    return [f'messages:{conversation_key(user_id, partner_id)}']
+
+
+def _conversation_query(user_id, partner_id):
+    # 两个方向的消息都带同一个 conversation_key，不再需要 (我->他) OR (他->我)
+    # 排序由调用方决定 (id 自增，和发送顺序一致)
+    return Message.query.filter(Message.conversation_key == conversation_key(user_id, partner_id))
+
+
+def _fetch_since(user_id, partner_id, since_id, limit):
+    """取 since_id 之后的最多 limit 条消息，返回 (消息列表, 是否还有更多)"""
+    # since_id 落在归档范围内时先从归档表取 (归档的 id 都比热表小)
+    msgs = archive.fetch_since(conversation_key(user_id, partner_id), since_id, limit + 1)
+    if len(msgs) <= limit:
+        since_id = msgs[-1].id if msgs else since_id
+        msgs += _conversation_query(user_id, partner_id) \
+            .filter(Message.id > since_id).order_by(Message.id.asc()).limit(limit + 1 - len(msgs)).all()
+    return msgs[:limit], len(msgs) > limit
+
+
+def _fetch_before(user_id, partner_id, before_id, limit):
+    """
+    取 before_id 之前最近的 limit 条消息 (before_id 为 None 时取最新的一页)
+    倒序取出再翻转成正序，返回 (消息列表, 是否还有更早的)
+    """
+    query = _conversation_query(user_id, partner_id)
+    if before_id is not None:
+        query = query.filter(Message.id < before_id)
+    msgs = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    if len(msgs) <= limit:
+        # 热表里这个会话已经翻到头了。归档过的会话才可能有更早的消息 (归档的 id 都比热表小)
+        key = conversation_key(user_id, partner_id)
+        if archive.archived_max_id(key):
+            if before_id is None and msgs:
+                # 首屏不查归档表，用 has_more 告诉客户端还有更早的，等往上翻过热表的范围再去取
+                return msgs[::-1], True
+            floor = msgs[-1].id if msgs else before_id
+            msgs += archive.fetch_before(key, floor, limit + 1 - len(msgs))
+    return msgs[:limit][::-1], len(msgs) > limit
+
+
 # --- 获取消息记录 (获取我和某人的聊天历史) ---
+# 默认返回最新的一页: ?limit=20，has_more 表示还有更早的消息
+# 向上翻页: ?before_id=<已显示的第一条消息id>，返回它之前的一页
+# 增量拉取: ?since_id=<已有的最后一条消息id>，只返回更新的消息，has_more 表示还有更新的
 @bp.route('/messages', methods=['GET'])
+@conditional(_messages_resource)
 def get_messages():
     try:
         user_id = request.args.get('user_id')
         partner_id = request.args.get('partner_id')  # 对方ID
+        since_id = request.args.get('since_id', type=int)
+        before_id = request.args.get('before_id', type=int)
 
         if not user_id or not partner_id:
             return jsonify({"code": 400, "msg": "参数缺失"}), 400
 
-        # 查询逻辑：(发送者是我 且 接收者是他) OR (发送者是他 且 接收者是我)
-        # 按时间正序排列
-        msgs = Message.query.filter(
-            or_(
-                and_(Message.sender_id == user_id, Message.receiver_id == partner_id),
-                and_(Message.sender_id == partner_id, Message.receiver_id == user_id)
-            )
-        ).order_by(Message.create_time.asc()).all()
-
-        data = []
-        for m in msgs:
-            # 判断这条消息是不是我发的
-            is_me = (str(m.sender_id) == str(user_id))
-
-            # 【新增】判断内容类型 (文本 vs 图片)
-            msg_type = "image" if m.content.startswith("image:") else "text"
-            # 如果是图片，去掉前缀只保留 URL
-            clean_content = m.content.replace("image:", "") if msg_type == "image" else m.content
-
-            data.append({
-                "id": m.id,
-                "type": msg_type,  # 告诉前端这是图片还是字
-                "content": clean_content,
-                "is_me": is_me,
-                "time": m.create_time.strftime("%H:%M")
-            })
-
-        return jsonify({"code": 200, "data": data})
+        if since_id is not None:
+            msgs, has_more = _fetch_since(user_id, partner_id, since_id, get_page_limit())
+        else:
+            msgs, has_more = _fetch_before(user_id, partner_id, before_id, get_page_limit())
+
+        marks = conversations.read_marks(user_id, partner_id)
+        data = [_pack_message(m, user_id, marks) for m in msgs]
+        return jsonify({"code": 200, "data": data, "has_more": has_more})
+    except Exception as e:
+        return jsonify({"code": 500, "msg": str(e)}), 500
+
+
+# --- 长轮询: 有新消息立即返回，否则最多挂起 timeout 秒 ---
+@bp.route('/messages/poll', methods=['GET'])
+def poll_messages():
+    try:
+        user_id = request.args.get('user_id', type=int)
+        partner_id = request.args.get('partner_id', type=int)
+        since_id = request.args.get('since_id', 0, type=int)
+        timeout = max(0, min(request.args.get('timeout', POLL_TIMEOUT, type=int), POLL_TIMEOUT))
+
+        if user_id is None or partner_id is None:
+            return jsonify({"code": 400, "msg": "参数缺失"}), 400
+
+        limit = get_page_limit()
+        with message_notifier.listen(conversation_key(user_id, partner_id)) as event:
+            msgs, has_more = _fetch_since(user_id, partner_id, since_id, limit)
+            if not msgs:
+                # 等待期间不占用数据库连接；醒来后重新开事务，才能看到别的请求刚提交的消息
+                db.session.close()
+                event.wait(timeout)
+                msgs, has_more = _fetch_since(user_id, partner_id, since_id, limit)
+
+        marks = conversations.read_marks(user_id, partner_id)
+        data = [_pack_message(m, user_id, marks) for m in msgs]
+        return jsonify({"code": 200, "data": data, "has_more": has_more})
     except Exception as e:
         return jsonify({"code": 500, "msg": str(e)}), 500
 
 
-# --- (可选) 标记已读 ---
+# --- SSE 推送: 一直保持连接，有新消息就以 event-stream 格式推下去 ---
+@bp.route('/messages/stream', methods=['GET'])
+def stream_messages():
+    user_id = request.args.get('user_id', type=int)
+    partner_id = request.args.get('partner_id', type=int)
+    # 断线重连时浏览器会自动带上 Last-Event-ID
+    since_id = request.headers.get('Last-Event-ID', type=int) \
+        or request.args.get('since_id', 0, type=int)
+
+    if user_id is None or partner_id is None:
+        return jsonify({"code": 400, "msg": "参数缺失"}), 400
+
+    key = conversation_key(user_id, partner_id)
+
+    def generate():
+        yield ": connected\n\n"  # 先发一行，让客户端立刻拿到响应头
+        last_id = since_id
+        while True:
+            with message_notifier.listen(key) as event:
+                msgs, _ = _fetch_since(user_id, partner_id, last_id, MAX_PAGE_SIZE)
+                marks = conversations.read_marks(user_id, partner_id)
+                db.session.close()
+                if not msgs:
+                    if not event.wait(POLL_TIMEOUT):
+                        yield ": keepalive\n\n"  # 定期发注释行，防止代理断开空闲连接
+                    continue
+
+            for m in msgs:
+                last_id = m.id
+                payload = current_app.json.dumps(_pack_message(m, user_id, marks))
+                yield f"id: {m.id}\nevent: message\ndata: {payload}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# --- 会话列表 (收件箱): 每个聊过天的人一行，按最后一条消息时间倒序 ---
+def _inbox_select(user_id, me_col, partner_col, unread_col):
+    """我在会话里可能是 user_a 也可能是 user_b，两边各查一次再 UNION ALL"""
+    return select(
+        Conversation.id.label('id'),
+        partner_col.label('partner_id'),
+        unread_col.label('unread'),
+        Conversation.last_message_id.label('last_message_id'),
+        Conversation.last_sender_id.label('last_sender_id'),
+        Conversation.last_preview.label('last_preview'),
+        Conversation.last_time.label('last_time'),
+    ).where(me_col == user_id)
+
+
+@bp.route('/conversations', methods=['GET'])
+@conditional(lambda: [f"inbox:{request.args.get('user_id', type=int)}", 'users'])
+def get_conversations():
+    try:
+        user_id = request.args.get('user_id', type=int)
+        if user_id is None:
+            return jsonify({"code": 400, "msg": "参数缺失"}), 400
+
+        inbox = union_all(
+            _inbox_select(user_id, Conversation.user_a, Conversation.user_b, Conversation.unread_a),
+            _inbox_select(user_id, Conversation.user_b, Conversation.user_a, Conversation.unread_b)
+        ).subquery()
+        query = db.session.query(inbox, User.username, User.avatar, User.avatar_thumb) \
+            .outerjoin(User, User.id == inbox.c.partner_id)
+        rows, next_cursor = paginate_by_time(query, inbox.c.last_time, inbox.c.id)
+
+        data = [{
+            "partner_id": row.partner_id,
+            "partner_name": row.username,
+            "partner_avatar": row.avatar_thumb or row.avatar,
+            "last_message": row.last_preview,
+            "last_message_id": row.last_message_id,
+            "last_is_me": row.last_sender_id == user_id,
+            "time": row.last_time.strftime("%m-%d %H:%M"),
+            "unread": row.unread,
+        } for row in rows]
+        return jsonify({"code": 200, "data": data, "next_cursor": next_cursor})
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
+    except Exception as e:
+        return jsonify({"code": 500, "msg": str(e)}), 500
+
+
+# --- 标记已读: 推进我在这个会话里的已读水位 ---
+# 可选 last_read_id: 只读到这一条为止，不传则读到最后一条
 @bp.route('/messages/read', methods=['POST'])
 def mark_read():
     try:
@@ -94,9 +279,16 @@ def mark_read():
         sender_id = data.get('sender_id')  # 对方
         receiver_id = data.get('receiver_id')  # 我
 
-        # 把所有对方发给我的未读消息标记为已读
-        # Message.query.filter_by(sender_id=sender_id, receiver_id=receiver_id, is_read=False).update(dict(is_read=True))
-        # db.session.commit()
-        return jsonify({"code": 200, "msg": "已读"})
+        if not sender_id or not receiver_id:
+            return jsonify({"code": 400, "msg": "参数缺失"}), 400
+
+        # 不管积压了多少条未读，都只更新会话表里的一行
+        read_id = conversations.mark_read(receiver_id, sender_id, data.get('last_read_id'))
+        resource_versions.bump(f'messages:{conversation_key(sender_id, receiver_id)}', f'inbox:{receiver_id}')
+        db.session.commit()
+
+        # 通知对方: 他发的消息已被读到 read_id (已读回执)
+        publish_event(sender_id, 'read', {"partner_id": int(receiver_id), "last_read_id": read_id})
+        return jsonify({"code": 200, "msg": "已读", "last_read_id": read_id})
     except Exception as e:
         return jsonify({"code": 500, "msg": str(e)}), 500
\ No newline at end of file
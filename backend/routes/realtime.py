@@ -0,0 +1,49 @@
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from broker import get_broker
+
+try:
+    from flask_sock import Sock
+except ImportError:  # 可选依赖: pip install flask-sock，没装时只提供 SSE
+    Sock = None
+
+bp = Blueprint('realtime', __name__)
+
+# 空闲多久发一次心跳 (秒)
+KEEPALIVE_INTERVAL = 25
+
+
+# --- WebSocket: 每个登录用户一条连接，推送私信 / 订单状态 / 积分变化 ---
+if Sock is not None:
+    sock = Sock()
+
+    @sock.route('/ws/<int:user_id>', bp=bp)
+    def user_socket(ws, user_id):
+        with get_broker().subscribe(f"user:{user_id}") as sub:
+            while True:
+                event = sub.get(timeout=KEEPALIVE_INTERVAL)
+                # 连接已断开时 send 会抛 ConnectionClosed，由 flask-sock 处理
+                ws.send(current_app.json.dumps(event or {"type": "ping"}))
+
+
+# --- SSE: 同样的事件流，给不方便用 WebSocket 的客户端 ---
+@bp.route('/events', methods=['GET'])
+def user_events():
+    user_id = request.args.get('user_id', type=int)
+    if user_id is None:
+        return jsonify({"code": 400, "msg": "参数缺失"}), 400
+
+    broker = get_broker()
+
+    def generate():
+        # 在生成器里订阅: 客户端在响应开始之前就断开时生成器根本不会执行，订阅也就不会泄漏
+        with broker.subscribe(f"user:{user_id}") as sub:
+            yield ": connected\n\n"  # 先发一行，让客户端立刻拿到响应头
+            while True:
+                event = sub.get(timeout=KEEPALIVE_INTERVAL)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {current_app.json.dumps(event['data'])}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
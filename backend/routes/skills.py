@@ -1,31 +1,63 @@
 from flask import Blueprint, jsonify, request
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, case, literal, select, union_all
 from extensions import db
 from models import Skill, LostItem, User
-from utils import save_uploaded_file
+from utils import save_uploaded_file, claim_uploaded_file, process_image_later, paginate_by_time, paginate_by_rank, parse_fields, select_columns, pack_row
+import search
+from cache import hot_tags_cache, resource_versions
+from http_cache import conditional
+from broker import publish_event
 
 bp = Blueprint('skills', __name__)
 
 
 # --- 获取技能列表 ---
+# 列表可输出的字段 (?fields=id,title,image 只返回其中一部分)
+SKILL_LIST_FIELDS = {
+    "id": ([Skill.id], lambda r: r.id),
+    "title": ([Skill.title], lambda r: r.title),
+    "cost": ([Skill.cost], lambda r: r.cost),
+    "type": ([Skill.type], lambda r: r.type),
+    "image": ([Skill.image], lambda r: r.image),
+    "thumb": ([Skill.thumb, Skill.image], lambda r: r.thumb or r.image),  # 卡片用的小图
+    "status": ([Skill.status], lambda r: r.status),
+    "user": ([User.username.label('author_name')], lambda r: r.author_name or "未知用户"),
+    "user_id": ([Skill.user_id], lambda r: r.user_id),
+}
+
+
 @bp.route('/skills', methods=['GET'])
+@conditional(lambda: ['skills', 'users'])
 def get_skills():
     try:
         keyword = request.args.get('q')
-        query = Skill.query.filter_by(status=0)  # 只显示未接单
+        skill_type = request.args.get('type', type=int)  # 1=我能提供, 2=需要帮助
+        fields = parse_fields(SKILL_LIST_FIELDS)
+
+        # 只查需要的列，并且一次 JOIN 出作者名，避免逐行访问 s.author 产生 N+1 查询
+        query = db.session.query(
+            *select_columns(SKILL_LIST_FIELDS, fields, Skill.id, Skill.create_time)
+        ).filter(Skill.status == 0)  # 只显示未接单
+        if "user" in fields:
+            query = query.outerjoin(User, User.id == Skill.user_id)
+        if skill_type is not None:
+            query = query.filter(Skill.type == skill_type)
+
         if keyword:
-            query = query.filter(Skill.title.contains(keyword) | Skill.cost.contains(keyword))
-        skills = query.order_by(Skill.create_time.desc()).all()
+            # 走倒排索引，按相关度排序
+            ranked = search.ranked_subquery('skill', keyword)
+            if ranked is None:
+                return jsonify({"code": 200, "data": [], "next_cursor": None})
+            query = query.join(ranked, ranked.c.item_id == Skill.id)
+            skills, next_cursor = paginate_by_rank(query, ranked.c.score, Skill.id)
+        else:
+            # 游标分页: ?limit=20&cursor=xxx
+            skills, next_cursor = paginate_by_time(query, Skill.create_time, Skill.id)
 
-        data = []
-        for s in skills:
-            author_name = s.author.username if s.author else "未知用户"
-            data.append({
-                "id": s.id, "title": s.title, "cost": s.cost, "type": s.type,
-                "image": s.image, "status": s.status,
-                "user": author_name, "user_id": s.user_id
-            })
-        return jsonify({"code": 200, "data": data})
+        data = [pack_row(s, fields, SKILL_LIST_FIELDS) for s in skills]
+        return jsonify({"code": 200, "data": data, "next_cursor": next_cursor})
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
     except Exception as e:
         return jsonify({"code": 500, "msg": str(e)}), 500
 
@@ -45,7 +77,11 @@ def create_skill():
 
         # 2. 文件数据
         image_file = request.files.get('image')
-        image_url = save_uploaded_file(image_file)
+        if request.form.get('image_url'):
+            # 已经通过断点续传接口 (/api/uploads) 传好的图片
+            image_url = claim_uploaded_file(request.form.get('image_url'))
+        else:
+            image_url = save_uploaded_file(image_file)
 
         new_skill = Skill(
             title=title,
@@ -55,8 +91,16 @@ def create_skill():
             user_id=user_id
         )
         db.session.add(new_skill)
+        db.session.flush()  # 拿到 id 后写搜索索引，和帖子在同一个事务里提交
+        search.index_item('skill', new_skill)
+        # 缩略图等由后台任务生成，原图存好就返回
+        job = process_image_later(image_url, new_skill)
+        resource_versions.bump('skills', f'user:{user_id}')
         db.session.commit()
-        return jsonify({"code": 200, "msg": "发布成功"})
+        hot_tags_cache.clear()
+        return jsonify({"code": 200, "msg": "发布成功", "data": {"id": new_skill.id, "job_id": job.id if job else None}})
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({"code": 500, "msg": str(e)}), 500
@@ -89,7 +133,17 @@ def accept_order():
         # 更新状态为进行中 (1)
         item.status = 1
         item.helper_id = user_id
+        # 已被接单的帖子不再出现在搜索结果里
+        search.remove_item(category if category == 'skill' else 'lost', item.id)
+        resource_versions.bump('skills' if category == 'skill' else 'lost',
+                               f'helps:{item.user_id}', f'helps:{item.helper_id}')
         db.session.commit()
+        hot_tags_cache.clear()
+        # 通知发布者: 你的单被接了
+        publish_event(item.user_id, 'order', {
+            "id": item.id, "category": category, "status": item.status,
+            "action": "accepted", "title": item.title, "by": item.helper_id
+        })
 
         return jsonify({"code": 200, "msg": "接单成功"})
     except Exception as e:
@@ -147,7 +201,20 @@ def finish_order():
 
         # 4. 更新状态
         item.status = 2
+        resource_versions.bump(f'helps:{item.user_id}', f'helps:{item.helper_id}')
+        if target_user:
+            resource_versions.bump(f'user:{target_user.id}')
         db.session.commit()
+        hot_tags_cache.clear()
+
+        # 通知双方订单已完成，并告诉得分的一方积分变化
+        for uid in (item.user_id, item.helper_id):
+            publish_event(uid, 'order', {
+                "id": item.id, "category": category, "status": item.status,
+                "action": "finished", "title": item.title
+            })
+        if target_user:
+            publish_event(target_user.id, 'points', {"points": target_user.points, "change": reward_points})
 
         msg = f"订单已完成，{target_user.username if target_user else '用户'} 积分+5"
         return jsonify({"code": 200, "msg": msg})
@@ -194,10 +261,17 @@ def review_order():
             return jsonify({"code": 403, "msg": "无权操作"}), 403
 
         # 3. 结算评价积分 (+/- 2分) 给对方
+        resource_versions.bump(f'helps:{item.user_id}', f'helps:{item.helper_id}')
         if target_user:
             change = 2 if action == 'reward' else -2
             target_user.points += change
+            resource_versions.bump(f'user:{target_user.id}')
             db.session.commit()
+            publish_event(target_user.id, 'order', {
+                "id": item.id, "category": category, "status": item.status,
+                "action": "reviewed", "title": item.title, "review": action
+            })
+            publish_event(target_user.id, 'points', {"points": target_user.points, "change": change})
             return jsonify({"code": 200, "msg": f"评价成功，对方积分 {'+2' if change > 0 else '-2'}"})
 
         db.session.commit()
@@ -208,58 +282,75 @@ def review_order():
 
 
 # --- 获取"我参与的互助" ---
+def _helps_select(model, category, user_id):
+    """
+    某一类帖子里"我参与的"部分: 我接的单，或者我发布且已被接的单
+    同时 JOIN 出对方的用户名 (我是发布者 -> 对方是接单人，否则对方是发布者)
+    """
+    is_poster = model.user_id == user_id
+    target_id = case((is_poster, model.helper_id), else_=model.user_id)
+    return select(
+        model.id.label('id'),
+        literal(category).label('category'),
+        model.title.label('title'),
+        model.image.label('image'),
+        model.thumb.label('thumb'),
+        model.status.label('status'),
+        model.create_time.label('create_time'),
+        model.user_id.label('user_id'),
+        model.poster_review.label('poster_review'),
+        model.helper_review.label('helper_review'),
+        target_id.label('target_id'),
+        User.username.label('target_name'),
+    ).outerjoin(User, User.id == target_id).where(or_(
+        model.helper_id == user_id,
+        and_(model.user_id == user_id, model.status != 0)
+    ))
+
+
 @bp.route('/user/helps/<int:user_id>', methods=['GET'])
+@conditional(lambda user_id: [f'helps:{user_id}', 'users'])
 def get_my_helps(user_id):
     try:
-        skill_filter = or_(
-            Skill.helper_id == user_id,
-            and_(Skill.user_id == user_id, Skill.status != 0)
-        )
-        lost_filter = or_(
-            LostItem.helper_id == user_id,
-            and_(LostItem.user_id == user_id, LostItem.status != 0)
-        )
-
-        my_skills = Skill.query.filter(skill_filter).all()
-        my_losts = LostItem.query.filter(lost_filter).all()
+        # 技能和失物用一条 UNION ALL 查出来，在数据库里按真实时间排序
+        helps = union_all(
+            _helps_select(Skill, "skill", user_id),
+            _helps_select(LostItem, "lost", user_id)
+        ).subquery()
+        rows = db.session.execute(
+            select(helps).order_by(helps.c.create_time.desc(), helps.c.id.desc())
+        ).all()
 
         data = []
-
-        def pack_item(obj, cat):
-            is_poster = (str(obj.user_id) == str(user_id))
+        for row in rows:
+            is_poster = (row.user_id == user_id)
 
             if is_poster:
-                target_id = obj.helper_id
-                helper_user = User.query.get(target_id) if target_id else None
-                target_name = helper_user.username if helper_user else "未知接单人"
-                my_review = obj.poster_review
+                target_name = row.target_name or "未知接单人"
+                my_review = row.poster_review
             else:
-                target_id = obj.user_id
-                target_name = obj.author.username if obj.author else "未知发布者"
-                my_review = obj.helper_review
+                target_name = row.target_name or "未知发布者"
+                my_review = row.helper_review
 
-            if obj.create_time:
-                time_str = obj.create_time.strftime("%Y-%m-%d %H:%M")
+            if row.create_time:
+                time_str = row.create_time.strftime("%Y-%m-%d %H:%M")
             else:
                 time_str = "未知时间"
 
-            return {
-                "id": obj.id,
-                "category": cat,
-                "title": obj.title,
-                "image": obj.image,
-                "status": obj.status,
+            data.append({
+                "id": row.id,
+                "category": row.category,
+                "title": row.title,
+                "image": row.image,
+                "thumb": row.thumb or row.image,
+                "status": row.status,
                 "create_time": time_str,
                 "is_poster": is_poster,
-                "target_id": target_id,
+                "target_id": row.target_id,
                 "target_name": target_name,
                 "my_review": my_review
-            }
-
-        for s in my_skills: data.append(pack_item(s, "skill"))
-        for l in my_losts: data.append(pack_item(l, "lost"))
+            })
 
-        data.sort(key=lambda x: x['create_time'], reverse=True)
         return jsonify({"code": 200, "data": data})
     except Exception as e:
         print(f"Get helps error: {e}")
@@ -267,44 +358,50 @@ def get_my_helps(user_id):
 
 
 # --- 获取热门标签 (智能导航版) ---
+def _load_hot_tags():
+    # 1. 获取最新的技能标题
+    skill_titles = db.session.query(Skill.title) \
+        .filter_by(status=0) \
+        .order_by(Skill.create_time.desc()) \
+        .limit(6).all()
+
+    # 2. 获取最新的失物标题
+    lost_titles = db.session.query(LostItem.title) \
+        .filter_by(status=0) \
+        .order_by(LostItem.create_time.desc()) \
+        .limit(4).all()
+
+    tags = []
+    seen_titles = set()
+
+    # 封装数据：带上 category 标记
+    for t in skill_titles:
+        if t[0] and t[0] not in seen_titles:
+            tags.append({"text": t[0], "cat": "skill"})  # 标记为 skill
+            seen_titles.add(t[0])
+
+    for t in lost_titles:
+        if t[0] and t[0] not in seen_titles:
+            tags.append({"text": t[0], "cat": "lost"})  # 标记为 lost
+            seen_titles.add(t[0])
+
+    # 如果没数据，给点默认的
+    if not tags:
+        tags = [
+            {"text": "Python", "cat": "skill"},
+            {"text": "雨伞", "cat": "lost"}
+        ]
+
+    # 返回前 8 个
+    return tags[:8]
+
+
 @bp.route('/tags', methods=['GET'])
 def get_hot_tags():
     try:
-        # 1. 获取最新的技能标题
-        skill_titles = db.session.query(Skill.title) \
-            .filter_by(status=0) \
-            .order_by(Skill.create_time.desc()) \
-            .limit(6).all()
-
-        # 2. 获取最新的失物标题
-        lost_titles = db.session.query(LostItem.title) \
-            .filter_by(status=0) \
-            .order_by(LostItem.create_time.desc()) \
-            .limit(4).all()
-
-        tags = []
-        seen_titles = set()
-
-        # 封装数据：带上 category 标记
-        for t in skill_titles:
-            if t[0] and t[0] not in seen_titles:
-                tags.append({"text": t[0], "cat": "skill"})  # 标记为 skill
-                seen_titles.add(t[0])
-
-        for t in lost_titles:
-            if t[0] and t[0] not in seen_titles:
-                tags.append({"text": t[0], "cat": "lost"})  # 标记为 lost
-                seen_titles.add(t[0])
-
-        # 如果没数据，给点默认的
-        if not tags:
-            tags = [
-                {"text": "Python", "cat": "skill"},
-                {"text": "雨伞", "cat": "lost"}
-            ]
-
-        # 返回前 8 个
-        return jsonify({"code": 200, "data": tags[:8]})
+        # 首页每次打开都会请求，走进程内缓存，发布/接单等操作时失效
+        tags = hot_tags_cache.get_or_set('tags', _load_hot_tags)
+        return jsonify({"code": 200, "data": tags})
     except Exception as e:
         print(e)
-        return jsonify({"code": 500, "msg": str(e)}), 500
\ No newline at end of file
+        return jsonify({"code": 500, "msg": str(e)}), 500
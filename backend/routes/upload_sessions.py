@@ -0,0 +1,161 @@
+"""
+断点续传上传
+
+1. POST /api/uploads {filename, size}            -> {upload_id, offset: 0, chunk_size}
+2. PUT  /api/uploads/<id>?offset=N  (请求体是这一块的原始字节，可重复多次)
+3. GET  /api/uploads/<id>                        -> {offset, size}  (断线后问服务器收到了多少)
+4. POST /api/uploads/<id>/finalize               -> {url}
+
+每一块直接按块写进 UPLOAD_FOLDER/.sessions/<id>.part，不在内存里攒整个文件；
+.part 文件的大小就是已经收到的字节数，服务重启也不丢进度。
+finalize 后文件收进按内容寻址的存储，返回的 url 可以作为
+create_skill / create_lost_item 的 image_url、update_user 的 avatar_url、send_message 的 image_url 提交。
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+from flask import Blueprint, current_app, jsonify, request
+from werkzeug.exceptions import HTTPException
+from extensions import db
+from models import UploadSession
+from uploads import detect_image_type, HEAD_SIZE
+from utils import upload_url
+import storage
+
+bp = Blueprint('upload_sessions', __name__)
+
+# 建议客户端每块的大小 (MAX_CONTENT_LENGTH 更小时按它)
+CHUNK_SIZE = 1024 * 1024
+# 没完成的会话 / finalize 后一直没被帖子用到的文件，保留多久
+SESSION_TTL = timedelta(hours=24)
+_COPY_SIZE = 64 * 1024
+
+
+def _part_path(upload_id):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], '.sessions', f"{upload_id}.part")
+
+
+def _received(upload_id):
+    try:
+        return os.path.getsize(_part_path(upload_id))
+    except FileNotFoundError:
+        return 0
+
+
+def _max_size():
+    return current_app.config.get('UPLOAD_MAX_SIZE', current_app.config['MAX_CONTENT_LENGTH'])
+
+
+def _discard(session):
+    db.session.delete(session)
+    try:
+        os.remove(_part_path(session.id))
+    except FileNotFoundError:
+        pass
+
+
+def _expire_stale():
+    """顺手清理过期的会话，以及 finalize 之后没人认领的文件 (引用数一直是 0)"""
+    cutoff = datetime.now() - SESSION_TTL
+    for session in UploadSession.query.filter(UploadSession.create_time < cutoff).limit(100).all():
+        _discard(session)
+    storage.expire_unclaimed(cutoff)
+
+
+@bp.route('/uploads', methods=['POST'])
+def create_upload():
+    try:
+        data = request.get_json()
+        size = int(data.get('size') or 0)
+        if size <= 0:
+            return jsonify({"code": 400, "msg": "文件大小无效"}), 400
+        if size > _max_size():
+            return jsonify({"code": 413, "msg": f"文件过大，最大 {_max_size() / 1024 / 1024:g}MB"}), 413
+
+        _expire_stale()
+        session = UploadSession(id=uuid.uuid4().hex, user_id=data.get('user_id'),
+                                filename=(data.get('filename') or '')[:200], size=size)
+        os.makedirs(os.path.dirname(_part_path(session.id)), exist_ok=True)
+        open(_part_path(session.id), 'wb').close()
+        db.session.add(session)
+        db.session.commit()
+        # 每块都是一个请求，不能超过 MAX_CONTENT_LENGTH
+        chunk_size = min(CHUNK_SIZE, current_app.config['MAX_CONTENT_LENGTH'])
+        return jsonify({"code": 200, "data": {"upload_id": session.id, "offset": 0, "chunk_size": chunk_size}})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"code": 500, "msg": str(e)}), 500
+
+
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    session = UploadSession.query.get(upload_id)
+    if not session:
+        return jsonify({"code": 404, "msg": "上传会话不存在或已过期"}), 404
+    return jsonify({"code": 200, "data": {"offset": _received(upload_id), "size": session.size}})
+
+
+@bp.route('/uploads/<upload_id>', methods=['PUT'])
+def put_chunk(upload_id):
+    try:
+        session = UploadSession.query.get(upload_id)
+        if not session:
+            return jsonify({"code": 404, "msg": "上传会话不存在或已过期"}), 404
+
+        offset = request.args.get('offset', type=int)
+        received = _received(upload_id)
+        if offset != received:
+            # 客户端以为的进度和服务器不一致 (比如上一块其实已经写进来了)，按服务器的来
+            return jsonify({"code": 409, "msg": "偏移量不匹配", "data": {"offset": received}}), 409
+
+        with open(_part_path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            written, head = offset, b''
+            for chunk in iter(lambda: request.stream.read(_COPY_SIZE), b''):
+                if written + len(chunk) > session.size:
+                    f.truncate(offset)  # 这一块作废，进度退回块开头
+                    return jsonify({"code": 400, "msg": "超出声明的文件大小"}), 400
+                if offset == 0 and len(head) < HEAD_SIZE:
+                    # 第一块就检查文件头，不是图片不用等传完
+                    head += chunk[:HEAD_SIZE - len(head)]
+                    if len(head) >= HEAD_SIZE and detect_image_type(head) is None:
+                        f.close()
+                        _discard(session)
+                        db.session.commit()
+                        return jsonify({"code": 415, "msg": "只支持上传 PNG / JPG / GIF 图片"}), 415
+                f.write(chunk)
+                written += len(chunk)
+        return jsonify({"code": 200, "data": {"offset": written}})
+    except HTTPException:
+        raise  # 请求体超过 MAX_CONTENT_LENGTH 等，交给 init_uploads 注册的处理 (413)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"code": 500, "msg": str(e)}), 500
+
+
+@bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    try:
+        session = UploadSession.query.get(upload_id)
+        if not session:
+            return jsonify({"code": 404, "msg": "上传会话不存在或已过期"}), 404
+        received = _received(upload_id)
+        if received != session.size:
+            return jsonify({"code": 409, "msg": "文件还没有传完", "data": {"offset": received}}), 409
+
+        path = _part_path(upload_id)
+        with open(path, 'rb') as f:
+            ext = detect_image_type(f.read(HEAD_SIZE))
+        if ext is None:
+            _discard(session)
+            db.session.commit()
+            return jsonify({"code": 415, "msg": "只支持上传 PNG / JPG / GIF 图片"}), 415
+
+        # 只登记文件不加引用: 发帖 / 换头像 / 发消息时用 url 认领，才算真正被引用
+        rel = storage.put_path(path, ext, refs=0)
+        db.session.delete(session)
+        db.session.commit()
+        return jsonify({"code": 200, "data": {"url": upload_url(rel)}})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"code": 500, "msg": str(e)}), 500
@@ -0,0 +1,116 @@
+"""
+站内搜索: 基于字符二元组 (bigram) 的倒排索引
+
+中文没有空格分词，这里把标题/描述切成相邻两个字的组合:
+    "黑色充电器" -> 黑色 色充 充电 电器 器
+查询时要求关键词的每个二元组都命中，效果等价于原来的 LIKE '%kw%'，
+但走的是 search_tokens 表上的索引，不再全表扫描。
+
+只有 status=0 (待接单) 的帖子会进索引，接单/删除时同步移除。
+"""
+import re
+from collections import Counter
+from sqlalchemy import func
+from extensions import db
+from models import SearchToken, Skill, LostItem
+
+# 各分类参与索引的字段及权重
+INDEXED_FIELDS = {
+    'skill': (Skill, [('title', 3), ('cost', 1)]),
+    'lost': (LostItem, [('title', 3), ('desc', 1)]),
+}
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """把文本切成二元组，返回 {token: 出现次数}"""
+    counts = Counter()
+    if not text:
+        return counts
+    for run in _WORD_RE.findall(text.lower()):
+        for i in range(len(run) - 1):
+            counts[run[i:i + 2]] += 1
+        # 末尾单字也记一次，保证单字查询 ("伞") 能命中结尾的字
+        counts[run[-1]] += 1
+    return counts
+
+
+def index_item(category, item):
+    """把一条帖子写进倒排索引 (调用方负责 commit，和业务写入在同一事务里)"""
+    remove_item(category, item.id)
+    if item.status == 0:
+        _insert_tokens(category, item)
+
+
+def _insert_tokens(category, item):
+    _, fields = INDEXED_FIELDS[category]
+    weights = Counter()
+    for field, weight in fields:
+        for token, count in tokenize(getattr(item, field)).items():
+            weights[token] += count * weight
+
+    db.session.bulk_insert_mappings(SearchToken, [
+        {"category": category, "token": token, "item_id": item.id, "weight": w}
+        for token, w in weights.items()
+    ])
+
+
+def remove_item(category, item_id):
+    """从索引里删掉一条帖子 (删除 / 被接单后不再出现在搜索结果中)"""
+    SearchToken.query.filter_by(category=category, item_id=item_id) \
+        .delete(synchronize_session=False)
+
+
+def ranked_subquery(category, keyword):
+    """
+    根据关键词生成 (item_id, score) 子查询，按相关度排序时使用
+    关键词切不出任何词项时返回 None
+    """
+    runs = _WORD_RE.findall(keyword.lower())
+    bigrams = {run[i:i + 2] for run in runs for i in range(len(run) - 1)}
+
+    query = db.session.query(
+        SearchToken.item_id.label('item_id'),
+        func.sum(SearchToken.weight).label('score')
+    ).filter(SearchToken.category == category)
+
+    if bigrams:
+        # 每个二元组都要命中 (AND 语义)，分数 = 各词项权重之和
+        query = query.filter(SearchToken.token.in_(bigrams)) \
+            .group_by(SearchToken.item_id) \
+            .having(func.count(func.distinct(SearchToken.token)) == len(bigrams))
+    elif runs:
+        # 只输入了单个字: 用前缀匹配 (仍然走索引的范围扫描)
+        query = query.filter(SearchToken.token.startswith(runs[0], autoescape=True)) \
+            .group_by(SearchToken.item_id)
+    else:
+        return None
+
+    return query.subquery()
+
+
+def rebuild_index():
+    """重建全部索引 (初始化数据库、或给已有数据补建索引时使用)"""
+    SearchToken.query.delete()
+    for category, (model, _) in INDEXED_FIELDS.items():
+        last_id = 0
+        while True:
+            batch = model.query.filter(model.status == 0, model.id > last_id) \
+                .order_by(model.id).limit(500).all()
+            if not batch:
+                break
+            for item in batch:
+                _insert_tokens(category, item)
+            last_id = batch[-1].id
+            db.session.commit()
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    with create_app().app_context():
+        db.create_all()
+        rebuild_index()
+        print(">>> 搜索索引重建完成")
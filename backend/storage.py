@@ -0,0 +1,180 @@
+"""
+按内容寻址的上传文件存储
+
+文件名就是内容的 sha256，存放在 UPLOAD_FOLDER/ab/cd/<sha256>.<ext>:
+同一张图不管被发到技能、失物、私信还是当头像，磁盘上只有一份，URL 也一样 (客户端缓存直接命中)。
+
+blobs 表记录每个文件被引用了多少次。帖子删除、头像更换时 release，
+引用数归零才删掉文件 (连同缩略图)。删文件放在事务提交之后，事务回滚时不会误删。
+"""
+import hashlib
+import os
+import uuid
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Blob
+from uploads import UploadSpool
+import thumbnails
+import variants
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def blob_path(digest, ext):
+    """sha256 -> 相对 UPLOAD_FOLDER 的路径，按前两级分目录，避免单个目录里文件太多"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+def _hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def put(file, ext):
+    """
+    存储一个上传的文件 (FileStorage)，返回相对 UPLOAD_FOLDER 的路径，并把引用数 +1
+    内容已经存在时只增加引用 (这次的副本内容一样，直接覆盖过去)
+    调用方负责 commit
+    """
+    spool = file.stream if isinstance(file.stream, UploadSpool) else None
+    if spool:
+        # 流式落盘时已经边写边算好了哈希
+        return _place(spool.path, spool.sha256.hexdigest(), ext, spool.keep)
+
+    tmp_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f".{uuid.uuid4().hex}.part")
+    file.save(tmp_path)
+    return put_path(tmp_path, ext)
+
+
+def put_path(tmp_path, ext, refs=1):
+    """
+    把已经完整写在磁盘上的临时文件 (和 UPLOAD_FOLDER 在同一文件系统) 收进存储，返回相对路径
+    refs=0 时只登记文件、不增加引用 (断点续传上传完成时，等帖子真正用到它再 claim)
+    """
+    def move(target):
+        os.replace(tmp_path, target)
+
+    return _place(tmp_path, _hash_file(tmp_path), ext, move, refs)
+
+
+def _place(tmp_path, digest, ext, move, refs=1):
+    rel = blob_path(digest, ext)
+    target = os.path.join(current_app.config['UPLOAD_FOLDER'], rel)
+    # 先登记记录再放文件，并且总是用这次的副本覆盖 (内容相同，rename 是原子的):
+    # 同样的内容刚被 release 删掉时，它提交后的删文件会先确认记录不存在 (见 _unlink_released_files)，
+    # 文件在我们登记之后才放到位，不会被那边删掉
+    _acquire(digest, rel, os.path.getsize(tmp_path), refs)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    move(target)
+    # 事务最后回滚的话 (比如后面写搜索索引失败)，这个文件没有记录，expire_unclaimed 也找不到它，回滚时删掉
+    db.session.info.setdefault('placed_files', []).append((digest, [target]))
+    return rel
+
+
+def _acquire(digest, rel, size, refs=1):
+    updated = Blob.query.filter_by(sha256=digest) \
+        .update({Blob.refcount: Blob.refcount + refs}, synchronize_session=False)
+    if updated:
+        return
+    # 第一次出现的内容。并发上传同一张新图时另一边可能已经插入了，冲突后改走更新
+    try:
+        with db.session.begin_nested():
+            db.session.add(Blob(sha256=digest, path=rel, size=size, refcount=refs))
+    except IntegrityError:
+        Blob.query.filter_by(sha256=digest) \
+            .update({Blob.refcount: Blob.refcount + refs}, synchronize_session=False)
+
+
+def claim(rel):
+    """给已经存在的文件增加一次引用，文件不在存储里 (不是本站上传的) 时返回 False"""
+    if not rel:
+        return False
+    digest = os.path.splitext(os.path.basename(rel))[0]
+    updated = Blob.query.filter_by(sha256=digest, path=rel) \
+        .update({Blob.refcount: Blob.refcount + 1}, synchronize_session=False)
+    return bool(updated)
+
+
+def release(rel):
+    """
+    释放一次引用 (rel 是 put 返回的相对路径)，引用数归零时删除记录，提交后删除文件
+    不是按内容存储的老文件 (uuid 文件名) 没有记录，直接忽略
+    调用方负责 commit
+    """
+    if not rel:
+        return
+    digest = os.path.splitext(os.path.basename(rel))[0]
+    blob = Blob.query.filter_by(sha256=digest).with_for_update().first()
+    if blob is None:
+        return
+    blob.refcount -= 1
+    if blob.refcount <= 0:
+        _delete(blob)
+
+
+def expire_unclaimed(cutoff, limit=100):
+    """
+    删掉 cutoff 之后一直没人认领的文件 (断点续传 finalize 后引用数还是 0)，最多 limit 个
+    同样的内容后来又被 finalize 过时按最后一次算。调用方负责 commit
+    """
+    for blob in Blob.query.filter(Blob.refcount <= 0, Blob.update_time < cutoff) \
+            .limit(limit).with_for_update().all():
+        _delete(blob)
+
+
+def _delete(blob):
+    """删除记录，提交后删掉原图、缩略图和所有变体"""
+    db.session.delete(blob)
+    folder = current_app.config['UPLOAD_FOLDER']
+    paths = [os.path.join(folder, name) for name in (blob.path, thumbnails.thumbnail_name(blob.path))] \
+        + variants.variant_paths(folder, blob.path)
+    db.session.info.setdefault('unlink_after_commit', []).append((blob.sha256, paths))
+
+
+def _unlink_unreferenced(files):
+    """
+    files: [(sha256, [绝对路径...])]，删掉已经没有记录的内容的文件
+    同样的内容可能刚好又被上传了 (_place 在我们删掉记录之后插入了新记录)。
+    删文件前在单独的事务里锁住这条记录确认一遍，还在就不删；
+    _place 是先登记再放文件，锁着的时候它插不进来，删完之后它再放的文件也不会被删掉
+    """
+    with db.engine.begin() as conn:
+        for digest, paths in files:
+            if conn.execute(select(Blob.id).where(Blob.sha256 == digest).with_for_update()).first():
+                continue
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+@event.listens_for(Session, 'after_commit')
+def _unlink_released_files(session):
+    session.info.pop('placed_files', None)  # 放进来的文件已经和记录一起提交了
+    released = session.info.pop('unlink_after_commit', None)
+    if released:
+        _unlink_unreferenced(released)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_released_files(session, previous_transaction):
+    if previous_transaction.parent is None:  # 只有整个事务回滚才作废 (savepoint 回滚不算)
+        session.info.pop('unlink_after_commit', None)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _remove_rolled_back_files(session, transaction):
+    # 提交时 placed_files 已经在 after_commit 里清掉了，这里还有说明事务是回滚 / 没提交就关闭的
+    # (视图出错后不一定调用 rollback，请求结束时 session 直接关闭，所以不能只挂 after_soft_rollback)
+    if transaction.parent is None:
+        placed = session.info.pop('placed_files', None)
+        if placed:
+            # 记录跟着回滚了，别的事务也没在用这份内容时删掉
+            _unlink_unreferenced(placed)
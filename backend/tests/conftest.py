@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# 后端模块按顶层模块互相导入 (from extensions import db)，和在 backend 目录下运行时一样
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import db
+
+
+@pytest.fixture
+def app():
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'UPLOAD_FOLDER': tempfile.mkdtemp(),
+        'JOBS_SYNC': True,
+        'JOBS_WORKERS': 0,
+        'ARCHIVE_INTERVAL': 0,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,66 @@
+"""实时事件代理: MemoryBroker 的发布 / 订阅，以及通过 publish_event 推给 SSE 连接"""
+import pytest
+from broker import Broker, MemoryBroker, get_broker, publish_event
+from routes import realtime
+
+
+def test_publish_reaches_subscribers_of_the_channel():
+    broker = MemoryBroker()
+    with broker.subscribe('user:1') as first, broker.subscribe('user:1') as second, \
+            broker.subscribe('user:2') as other:
+        broker.publish('user:1', {"type": "ping"})
+        assert first.get(timeout=1) == {"type": "ping"}
+        assert second.get(timeout=1) == {"type": "ping"}
+        assert other.get(timeout=0.01) is None
+
+
+def test_closed_subscription_is_removed():
+    broker = MemoryBroker()
+    sub = broker.subscribe('user:1')
+    sub.close()
+    broker.publish('user:1', {"type": "ping"})
+    assert sub.get(timeout=0.01) is None
+    assert broker._channels == {}
+
+
+def test_slow_subscriber_drops_events_instead_of_blocking():
+    broker = MemoryBroker()
+    with broker.subscribe('user:1') as sub:
+        for i in range(sub.queue.maxsize + 5):
+            broker.publish('user:1', {"type": "n", "data": i})
+        assert sub.queue.qsize() == sub.queue.maxsize
+
+
+def test_incomplete_backend_fails_on_construction():
+    class PublishOnly(Broker):
+        def publish(self, channel, event):
+            pass
+
+    with pytest.raises(TypeError):
+        PublishOnly()
+
+
+def test_publish_event_goes_to_the_user_channel(app):
+    with get_broker().subscribe('user:7') as sub:
+        publish_event(7, 'points', {"points": 12})
+        publish_event(None, 'points', {"points": 0})  # 没有接收方时忽略
+        assert sub.get(timeout=1) == {"type": "points", "data": {"points": 12}}
+        assert sub.get(timeout=0.01) is None
+
+
+def test_sse_response_never_started_does_not_subscribe(app):
+    # 客户端在响应开始之前就断开: 生成器一次都没执行，不能留下订阅
+    with app.test_request_context('/api/events?user_id=3'):
+        resp = realtime.user_events()
+    resp.close()
+    assert get_broker()._channels == {}
+
+
+def test_sse_stream_unsubscribes_when_closed(app, client):
+    resp = client.get('/api/events?user_id=3')
+    stream = iter(resp.response)
+    assert next(stream) == b": connected\n\n"
+    publish_event(3, 'message', {"id": 1})
+    assert next(stream).startswith(b"event: message\ndata: {")
+    resp.close()
+    assert get_broker()._channels == {}
@@ -0,0 +1,81 @@
+"""后台任务队列: JOBS_SYNC 模式下直接执行，以及 worker 领取任务后的重试 / 失败"""
+from datetime import datetime, timedelta
+import pytest
+from extensions import db
+from models import Job
+import jobs
+
+calls = []
+
+
+@jobs.task('test_record')
+def _record(value):
+    calls.append(value)
+
+
+@jobs.task('test_fail')
+def _fail():
+    raise RuntimeError("boom")
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+def test_sync_mode_runs_job_inline(app):
+    job = jobs.enqueue('test_record', value=42)
+    assert calls == [42]
+    assert (job.status, job.attempts, job.last_error) == ('done', 1, None)
+    db.session.commit()
+    assert db.session.get(Job, job.id).status == 'done'
+
+
+def test_sync_mode_marks_failures_without_retrying(app):
+    job = jobs.enqueue('test_fail')
+    assert job.status == 'failed'
+    assert 'RuntimeError: boom' in job.last_error
+
+
+def test_worker_retries_with_backoff_then_fails(app):
+    app.config['JOBS_SYNC'] = False
+    job_id = jobs.enqueue('test_fail', max_attempts=2).id
+    db.session.commit()
+
+    assert jobs.run_one()
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts) == ('pending', 1)
+    assert job.run_after > datetime.now()  # 退避之后才能再领
+    assert not jobs.run_one()
+
+    job.run_after = datetime.now() - timedelta(seconds=1)
+    db.session.commit()
+    assert jobs.run_one()
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts, job.locked_until) == ('failed', 2, None)
+    assert not jobs.run_one()
+
+
+def test_worker_runs_pending_job(app):
+    app.config['JOBS_SYNC'] = False
+    job_id = jobs.enqueue('test_record', value='x').id
+    assert calls == []  # 提交之后由 worker 执行
+    db.session.commit()
+
+    assert jobs.run_one()
+    assert calls == ['x']
+    assert db.session.get(Job, job_id).status == 'done'
+
+
+def test_expired_lease_is_reclaimed(app):
+    app.config['JOBS_SYNC'] = False
+    job_id = jobs.enqueue('test_record', value=1).id
+    db.session.commit()
+    # worker 领了任务之后挂掉: 状态停在 running，租约过期
+    Job.query.filter_by(id=job_id).update({Job.status: 'running', Job.attempts: 1,
+                                           Job.locked_until: datetime.now() - timedelta(seconds=1)})
+    db.session.commit()
+
+    assert jobs.run_one()
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts) == ('done', 2)
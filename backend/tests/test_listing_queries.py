@@ -0,0 +1,48 @@
+"""列表接口一次 JOIN 出作者名: 查询次数不随返回条数增长 (没有 N+1)"""
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from extensions import db
+from models import LostItem, Skill, User
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.fixture
+def listings(app):
+    users = [User(username=f'user{i}', password='x', contact='x') for i in range(20)]
+    db.session.add_all(users)
+    db.session.flush()
+    for i in range(120):
+        author = users[i % len(users)]
+        db.session.add(Skill(title=f'skill {i}', cost='1', user_id=author.id))
+        db.session.add(LostItem(title=f'lost {i}', desc='x', location='x', type=0, user_id=author.id))
+    db.session.commit()
+    db.session.remove()  # 清掉身份映射，接口里访问作者只能靠查询
+
+
+@pytest.mark.parametrize('url', ['/api/skills', '/api/lost-items'])
+def test_listing_query_count_is_constant(client, listings, url):
+    counts = {}
+    for limit in (5, 100):
+        with count_queries() as statements:
+            resp = client.get(f'{url}?limit={limit}')
+        assert resp.status_code == 200
+        data = resp.get_json()['data']
+        assert len(data) == limit
+        assert all(row['user'].startswith('user') for row in data)
+        counts[limit] = len(statements)
+    # 一次查 ETag 用的版本号 (http_cache.conditional)，一次查列表本身
+    assert counts[5] == counts[100] == 2
@@ -0,0 +1,85 @@
+"""按内容寻址的存储: 同一张图只存一份，按引用数释放，最后一个引用删掉并提交后才删文件"""
+import io
+import os
+import pytest
+from PIL import Image
+from extensions import db
+from models import Blob, Skill, User
+import storage
+import thumbnails
+
+
+def png_bytes(color='red'):
+    buf = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def no_thumbnails(monkeypatch):
+    # 缩略图 / 变体不是这里要测的，后台任务直接跳过
+    monkeypatch.setattr(thumbnails, 'Image', None)
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='alice', password='x', contact='c')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def post_skill(client, user, data):
+    resp = client.post('/api/skills', data={'title': 't', 'cost': '1', 'user_id': user.id,
+                                            'image': (io.BytesIO(data), 'a.png')})
+    assert resp.status_code == 200, resp.get_json()
+    return resp.get_json()['data']['id']
+
+
+def delete_skill(client, skill_id):
+    assert client.post('/api/delete', json={'id': skill_id, 'category': 'skill'}).status_code == 200
+
+
+def test_same_image_is_stored_once(app, client, user):
+    data = png_bytes()
+    first, second = post_skill(client, user, data), post_skill(client, user, data)
+
+    images = {db.session.get(Skill, i).image for i in (first, second)}
+    assert len(images) == 1
+    blob = Blob.query.one()
+    assert blob.refcount == 2
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], blob.path), 'rb') as f:
+        assert f.read() == data
+
+
+def test_file_is_kept_until_last_reference_is_released(app, client, user):
+    data = png_bytes()
+    first, second = post_skill(client, user, data), post_skill(client, user, data)
+    blob = Blob.query.one()
+    path = os.path.join(app.config['UPLOAD_FOLDER'], blob.path)
+
+    delete_skill(client, first)
+    db.session.expire_all()
+    assert Blob.query.one().refcount == 1
+    assert os.path.exists(path)
+
+    delete_skill(client, second)
+    assert Blob.query.count() == 0
+    assert not os.path.exists(path)
+
+
+def test_release_unlinks_only_after_commit(app, client, user):
+    post_skill(client, user, png_bytes())
+    blob = Blob.query.one()
+    path = os.path.join(app.config['UPLOAD_FOLDER'], blob.path)
+
+    storage.release(blob.path)
+    db.session.flush()
+    assert os.path.exists(path)  # 事务还可能回滚
+    db.session.rollback()
+    assert os.path.exists(path)
+    assert Blob.query.one().refcount == 1
+
+    storage.release(blob.path)
+    db.session.commit()
+    assert not os.path.exists(path)
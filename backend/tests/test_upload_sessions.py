@@ -0,0 +1,120 @@
+"""断点续传上传: 分块写入、偏移量校验、文件头检查、finalize 后认领，以及没人认领的文件过期删除"""
+import io
+import os
+from datetime import datetime, timedelta
+import pytest
+from PIL import Image
+from extensions import db
+from models import Blob, UploadSession, User
+from uploads import HEAD_SIZE
+import thumbnails
+
+
+def png_bytes():
+    buf = io.BytesIO()
+    Image.new('RGB', (32, 32), 'blue').save(buf, 'PNG')
+    return buf.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def no_thumbnails(monkeypatch):
+    monkeypatch.setattr(thumbnails, 'Image', None)
+
+
+def start(client, size):
+    resp = client.post('/api/uploads', json={'filename': 'a.png', 'size': size})
+    assert resp.status_code == 200, resp.get_json()
+    return resp.get_json()['data']['upload_id']
+
+
+def put(client, upload_id, offset, chunk):
+    return client.put(f'/api/uploads/{upload_id}?offset={offset}', data=chunk)
+
+
+def upload(client, data):
+    """分两块传完并 finalize，返回 url"""
+    upload_id = start(client, len(data))
+    half = len(data) // 2
+    assert put(client, upload_id, 0, data[:half]).get_json()['data']['offset'] == half
+    assert put(client, upload_id, half, data[half:]).get_json()['data']['offset'] == len(data)
+    resp = client.post(f'/api/uploads/{upload_id}/finalize')
+    assert resp.status_code == 200, resp.get_json()
+    return resp.get_json()['data']['url']
+
+
+def test_chunk_size_fits_in_one_request(app, client):
+    app.config['MAX_CONTENT_LENGTH'] = 4096
+    resp = client.post('/api/uploads', json={'filename': 'a.png', 'size': 100})
+    assert resp.get_json()['data']['chunk_size'] == 4096
+
+
+def test_offset_mismatch_returns_server_progress(client):
+    data = png_bytes()
+    upload_id = start(client, len(data))
+    put(client, upload_id, 0, data[:20])
+
+    resp = put(client, upload_id, 0, data[:20])  # 重传已经写进去的一块
+    assert resp.status_code == 409
+    assert resp.get_json()['data']['offset'] == 20
+    assert client.get(f'/api/uploads/{upload_id}').get_json()['data']['offset'] == 20
+
+
+def test_non_image_is_rejected_on_first_chunk(app, client):
+    upload_id = start(client, 1000)
+    resp = put(client, upload_id, 0, b'x' * HEAD_SIZE)
+    assert resp.status_code == 415
+    assert db.session.get(UploadSession, upload_id) is None
+    assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], '.sessions', f'{upload_id}.part'))
+
+
+def test_chunk_larger_than_request_limit_is_413(app, client):
+    app.config.update(MAX_CONTENT_LENGTH=1024, UPLOAD_MAX_SIZE=10 * 1024)
+    upload_id = start(client, 4096)
+    resp = put(client, upload_id, 0, b'\x89PNG' + b'\0' * 2000)
+    assert resp.status_code == 413
+
+
+def test_finalize_before_complete_is_409(client):
+    data = png_bytes()
+    upload_id = start(client, len(data))
+    put(client, upload_id, 0, data[:10])
+    resp = client.post(f'/api/uploads/{upload_id}/finalize')
+    assert resp.status_code == 409
+    assert resp.get_json()['data']['offset'] == 10
+
+
+def test_finalized_file_is_claimed_by_post(app, client):
+    user = User(username='bob', password='x', contact='c')
+    db.session.add(user)
+    db.session.commit()
+
+    url = upload(client, png_bytes())
+    blob = Blob.query.one()
+    assert blob.refcount == 0  # 还没有帖子用到它
+    assert UploadSession.query.count() == 0
+
+    resp = client.post('/api/skills', data={'title': 't', 'cost': '1', 'user_id': user.id, 'image_url': url})
+    assert resp.status_code == 200, resp.get_json()
+    db.session.expire_all()
+    assert Blob.query.one().refcount == 1
+
+
+def test_claiming_unknown_url_is_400(client):
+    resp = client.post('/api/skills', data={'title': 't', 'cost': '1', 'user_id': 1,
+                                            'image_url': 'http://localhost/media/no/such/file.png'})
+    assert resp.status_code == 400
+
+
+def test_unclaimed_file_expires(app, client):
+    upload(client, png_bytes())
+    blob = Blob.query.one()
+    path = os.path.join(app.config['UPLOAD_FOLDER'], blob.path)
+    assert os.path.exists(path)
+
+    # 一天以前 finalize、一直没人认领
+    Blob.query.update({Blob.update_time: datetime.now() - timedelta(hours=25)})
+    db.session.commit()
+
+    start(client, 100)  # 新建会话时顺手清理
+    assert Blob.query.count() == 0
+    assert not os.path.exists(path)
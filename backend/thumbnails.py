@@ -0,0 +1,107 @@
+"""
+上传图片的缩略图
+
+列表卡片里的图片只有 100x100 左右，头像半径 35，直接加载原图 (动辄几 MB) 很浪费。
+上传时额外生成一张长边不超过 THUMB_SIZE 的缩略图，接口里用 thumb 字段返回。
+
+缩放是纯 CPU 活，放在独立的进程池里做，不占用处理请求的线程的 GIL。
+Pillow 是可选依赖 (pip install pillow)，没装时不生成缩略图，接口里 thumb 退回原图。
+
+用法: python thumbnails.py    # 给已有的、还没有缩略图的上传图片补生成
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # 可选依赖: pip install pillow，没装时不生成缩略图
+    Image = None
+
+# 2 倍于卡片的显示尺寸，高分屏上也清晰
+THUMB_SIZE = (200, 200)
+THUMB_SUFFIX = '_thumb'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def thumbnail_name(filename):
+    """xxx.jpg -> xxx_thumb.jpg；GIF 只取第一帧，存成 PNG"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}{THUMB_SUFFIX}{'.png' if ext.lower() == '.gif' else ext}"
+
+
+def render_thumbnail(src, dst, size=THUMB_SIZE):
+    """在子进程里执行: 等比缩放到 size 以内并保存"""
+    with Image.open(src) as im:
+        im.thumbnail(size)
+        if dst.lower().endswith(('.jpg', '.jpeg')):
+            im = im.convert('RGB')
+            im.save(dst, quality=80, optimize=True)
+        else:
+            im.save(dst, optimize=True)
+    return dst
+
+
+def get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 用 spawn 而不是 fork: 多线程的 Web 进程里 fork 可能把别的线程持有的锁一起复制过去
+            _executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def create_thumbnail(folder, filename, workers=2, timeout=30):
+    """
+    为 folder 下的 filename 生成缩略图，返回缩略图的相对路径 (和原图在同一目录)
+    没装 Pillow、图片损坏或超时都返回 None，调用方退回使用原图
+    """
+    if Image is None:
+        return None
+    dst_name = thumbnail_name(filename)
+    if os.path.exists(os.path.join(folder, dst_name)):
+        return dst_name  # 同一张图 (按内容存储) 之前已经生成过
+    try:
+        get_executor(workers).submit(render_thumbnail, os.path.join(folder, filename),
+                                      os.path.join(folder, dst_name)).result(timeout=timeout)
+        return dst_name
+    except Exception as e:
+        print(f"Thumbnail error ({filename}): {e}")
+        return None
+
+
+def backfill_thumbnails():
+    """给已有帖子和头像里、存在本地 uploads 目录下的图片补生成缩略图"""
+    from flask import current_app
+    from extensions import db
+    from models import Skill, LostItem, User
+    from utils import upload_url, upload_filename
+
+    folder = current_app.config['UPLOAD_FOLDER']
+    workers = current_app.config.get('THUMB_WORKERS', 2)
+    for model, image_col, thumb_col in [(Skill, 'image', 'thumb'), (LostItem, 'image', 'thumb'),
+                                        (User, 'avatar', 'avatar_thumb')]:
+        rows = model.query.filter(getattr(model, thumb_col).is_(None),
+                                  getattr(model, image_col).isnot(None)).all()
+        for row in rows:
+            filename = upload_filename(getattr(row, image_col))
+            if not filename or not os.path.exists(os.path.join(folder, filename)):
+                continue  # 外链图片 / 默认图不处理
+            thumb = create_thumbnail(folder, filename, workers)
+            if thumb:
+                setattr(row, thumb_col, upload_url(thumb))
+        db.session.commit()
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    # 生成的是带域名的 URL，和线上保持一致
+    with app.test_request_context(base_url=os.environ.get('PUBLIC_BASE_URL', 'http://127.0.0.1:5000')):
+        backfill_thumbnails()
+        print(">>> 缩略图补生成完成")
@@ -0,0 +1,107 @@
+"""
+上传文件的流式落盘
+
+Werkzeug 默认先把 multipart 里的文件读进内存 (或系统临时目录)，file.save() 时再整体复制一遍。
+这里换成自定义的 Request: 解析表单时文件内容按块直接写进 UPLOAD_FOLDER 下的临时文件，
+save_uploaded_file 只需要 rename 成最终文件名，不再复制。
+
+写入第一块时就检查文件头 (magic bytes)，不是图片立即中断 (415)；
+整个请求体超过 MAX_CONTENT_LENGTH 时 Werkzeug 在读之前 / 读到超限时就会拒绝 (413)。
+"""
+import hashlib
+import io
+import os
+import uuid
+from flask import Request, current_app, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+# 文件头 -> 扩展名 (只接受 ALLOWED_EXTENSIONS 里的几种图片)
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+HEAD_SIZE = max(len(sig) for sig, _ in IMAGE_SIGNATURES)
+
+
+def detect_image_type(head):
+    """根据文件开头的字节判断图片类型，不是支持的图片返回 None"""
+    for sig, ext in IMAGE_SIGNATURES:
+        if head.startswith(sig):
+            return ext
+    return None
+
+
+class UploadSpool(io.FileIO):
+    """
+    上传文件的落盘缓冲: 直接写在上传目录里的 .part 临时文件
+    边写边算 sha256，存储时按内容寻址不用再读一遍
+    请求结束时如果没有被 save_uploaded_file 认领，就自动删除
+    """
+
+    def __init__(self, folder):
+        self.path = os.path.join(folder, f".{uuid.uuid4().hex}.part")
+        super().__init__(self.path, 'w+b')
+        self.kept = False
+        self.image_type = None
+        self.sha256 = hashlib.sha256()
+        self._head = b''
+
+    def write(self, data):
+        if self.image_type is None and len(self._head) < HEAD_SIZE:
+            self._head += bytes(data[:HEAD_SIZE])
+            if len(self._head) >= HEAD_SIZE:
+                self.image_type = detect_image_type(self._head)
+                if self.image_type is None:
+                    self.close()  # 这个文件还没交给 request.files，要自己清理
+                    raise UnsupportedMediaType("只支持上传 PNG / JPG / GIF 图片")
+        self.sha256.update(data)
+        return super().write(data)
+
+    def finish(self):
+        """数据写完后调用: 文件太短、没能判断出类型时也视为非法"""
+        if self.image_type is None:
+            self.image_type = detect_image_type(self._head)
+        return self.image_type
+
+    def keep(self, target_path):
+        """把临时文件改名为最终文件 (同一个文件系统，rename 是原子的)"""
+        os.replace(self.path, target_path)
+        self.path = target_path
+        self.kept = True
+
+    def close(self):
+        super().close()
+        if not self.kept and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class StreamingUploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(current_app.config['UPLOAD_FOLDER'])
+
+
+def init_uploads(app):
+    if app.config.get('MAX_CONTENT_LENGTH') is None:  # Flask 默认是 None (不限制)
+        app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 单个请求最大 10MB
+    app.request_class = StreamingUploadRequest
+
+    @app.before_request
+    def parse_uploads_early():
+        # 在进入视图之前就把 multipart 解析完: 超限 / 非图片在这里抛出，
+        # 由下面的错误处理返回 413 / 415，而不是被视图里的 except Exception 吞成 500
+        if request.mimetype == 'multipart/form-data':
+            for file in request.files.values():
+                # 比文件头还短的文件写入时没法判断，在这里补一次检查
+                if file.filename and isinstance(file.stream, UploadSpool) and file.stream.finish() is None:
+                    raise UnsupportedMediaType("只支持上传 PNG / JPG / GIF 图片")
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def too_large(e):
+        limit_mb = app.config['MAX_CONTENT_LENGTH'] / 1024 / 1024
+        return jsonify({"code": 413, "msg": f"上传内容过大，最大 {limit_mb:g}MB"}), 413
+
+    @app.errorhandler(UnsupportedMediaType)
+    def unsupported(e):
+        return jsonify({"code": 415, "msg": e.description}), 415
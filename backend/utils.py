@@ -1,7 +1,17 @@
 import os
-import uuid
+import base64
+from datetime import datetime
 from werkzeug.utils import secure_filename
-from flask import current_app, url_for
+from flask import current_app, url_for, request
+from sqlalchemy import or_, and_
+from extensions import db
+from models import Skill, LostItem, User
+from uploads import UploadSpool
+from cache import resource_versions
+import jobs
+import thumbnails
+import storage
+import variants
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
@@ -9,6 +19,10 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 # 这里使用一个在线的灰色占位图，你也可以在 static 下放一个 default.png 然后指向它
 DEFAULT_IMAGE_URL = "https://via.placeholder.com/200x200/cccccc/999999?text=No+Image"
 
+# 列表分页: 默认每页条数 / 单页上限
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 
 def allowed_file(filename):
     """检查文件扩展名是否合法"""
@@ -16,23 +30,245 @@ def allowed_file(filename):
         filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def _store_upload(file):
+    """
+    把上传的文件存进 UPLOAD_FOLDER，返回相对路径；没文件或不合法返回 None
+    按内容寻址 (ab/cd/<sha256>.<ext>)，同样的内容只存一份，引用数 +1 (调用方负责 commit)
+    """
+    if not (file and allowed_file(file.filename)):
+        return None
+
+    spool = file.stream if isinstance(file.stream, UploadSpool) else None
+    # 扩展名以文件头识别出的真实类型为准，不信任客户端给的文件名
+    ext = spool.finish() if spool else file.filename.rsplit('.', 1)[1].lower()
+    if ext is None:
+        return None
+    return storage.put(file, ext)
+
+
+# 上传文件 URL 里的路径前缀: 现在走 /media/ (长缓存)，老数据里还有 /static/uploads/
+UPLOAD_URL_PREFIXES = ('/media/', '/static/uploads/')
+
+
+def upload_url(filename):
+    """
+    上传目录里的文件对外的 URL
+    例如: http://localhost:5000/media/ab/cd/xxx.jpg
+    _external=True 会生成带域名的完整 URL
+    """
+    return url_for('media.get_media', filename=filename, _external=True)
+
+
+def upload_filename(url):
+    """upload_url 的反向: 从 URL 里取出上传目录下的文件名，外链图片返回 None"""
+    for prefix in UPLOAD_URL_PREFIXES:
+        if url and prefix in url:
+            return url.rsplit(prefix, 1)[1]
+    return None
+
+
+def release_uploaded_file(url):
+    """帖子删除 / 头像更换时释放原来那张图，没有别的引用时提交后删除文件 (调用方负责 commit)"""
+    storage.release(upload_filename(url))
+
+
 def save_uploaded_file(file):
     """
     保存上传的文件并返回可访问的 URL
     如果没文件或不合法，返回默认 URL
     """
-    if file and allowed_file(file.filename):
-        # 生成一个安全且唯一的文件名 (使用 UUID 防止重名)
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4().hex}.{ext}"
+    filename = _store_upload(file)
+    return upload_url(filename) if filename else DEFAULT_IMAGE_URL
+
+
+def claim_uploaded_file(url):
+    """
+    认领一个通过断点续传接口 (/api/uploads) 传好的文件: 引用数 +1，返回它的 URL
+    url 不是本站上传的文件时抛出 ValueError (调用方负责 commit)
+    """
+    filename = upload_filename(url)
+    if not storage.claim(filename):
+        raise ValueError("无效的图片地址")
+    return upload_url(filename)
+
+
+# 有缩略图的图片列: 表名 -> (模型, 原图列, 缩略图列)
+IMAGE_COLUMNS = {
+    'skills': (Skill, 'image', 'thumb'),
+    'lost_items': (LostItem, 'image', 'thumb'),
+    'users': (User, 'avatar', 'avatar_thumb'),
+}
+
+
+def process_image_later(url, row=None):
+    """
+    图片存好之后，缩略图和常用尺寸的变体交给后台任务生成 (见 jobs.py)，请求不用等
+    row 是帖子 / 用户 (需要已经 flush 拿到 id)，缩略图生成后回填到它的缩略图列；消息图片不传
+    返回 Job，不需要处理时 (外链图片 / 同一张图之前已经处理过) 返回 None。调用方负责 commit
+    """
+    thumb_col = IMAGE_COLUMNS[row.__tablename__][2] if row is not None else None
+    if thumb_col:
+        setattr(row, thumb_col, None)  # 生成好之前接口里退回用原图
+    filename = upload_filename(url)
+    if not filename:
+        return None
+    thumb = thumbnails.thumbnail_name(filename)
+    if os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], thumb)):
+        # 按内容存储，同一张图之前已经处理过
+        if thumb_col:
+            setattr(row, thumb_col, upload_url(thumb))
+        return None
+    # worker 里没有请求上下文，URL 在这里先算好
+    return jobs.enqueue('image_derivatives', filename=filename, thumb_url=upload_url(thumb),
+                        table=row.__tablename__ if row is not None else None,
+                        row_id=row.id if row is not None else None)
+
+
+@jobs.task('image_derivatives')
+def _image_derivatives(filename, thumb_url, table, row_id):
+    """生成缩略图并回填，再预先生成客户端常用的几个变体 (首屏不用等转码)"""
+    if thumbnails.Image is None:
+        return  # 没装 Pillow，接口里一直用原图
+    folder = current_app.config['UPLOAD_FOLDER']
+    workers = current_app.config.get('THUMB_WORKERS', 2)
+    if not thumbnails.create_thumbnail(folder, filename, workers):
+        raise RuntimeError(f"缩略图生成失败: {filename}")  # 抛出去由队列按退避重试
+
+    for width, fmt in variants.PREWARM:
+        if fmt in variants.MODERN_FORMATS:
+            variants.get_variant(folder, filename, width, fmt, workers,
+                                 cache_size=current_app.config.get('VARIANT_CACHE_SIZE', variants.VARIANT_CACHE_SIZE))
+
+    # 耗时的活都做完了才动数据库，不让行锁 / 事务跨着转码
+    if table:
+        model, image_col, thumb_col = IMAGE_COLUMNS[table]
+        row = db.session.get(model, row_id)
+        # 排队期间帖子可能被删了、头像可能又换了，那就不用回填
+        if row is not None and upload_filename(getattr(row, image_col)) == filename:
+            setattr(row, thumb_col, thumb_url)
+            if table == 'users':
+                resource_versions.bump(f'user:{row.id}', 'users')
+            else:
+                resource_versions.bump('skills' if table == 'skills' else 'lost', f'user:{row.user_id}',
+                                       f'helps:{row.user_id}', f'helps:{row.helper_id}')
+
+
+# ==========================================
+#  游标分页 (keyset pagination)
+# ==========================================
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _b64decode(cursor):
+    return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+
+
+def encode_cursor(create_time, item_id):
+    """把 (create_time, id) 编码成不透明的游标字符串"""
+    return _b64encode(f"{create_time.isoformat()}|{item_id}")
+
+
+def decode_cursor(cursor):
+    """解析游标，格式不对时抛出 ValueError"""
+    try:
+        time_str, item_id = _b64decode(cursor).split('|')
+        return datetime.fromisoformat(time_str), int(item_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def get_page_limit():
+    """读取 ?limit= 参数，限制在 1 ~ MAX_PAGE_SIZE 之间"""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def paginate_by_time(query, time_col, id_col):
+    """
+    按 (create_time, id) 倒序做游标分页
+    不管表里有多少数据，每次都只扫描 limit+1 行 (配合 (status, create_time, id) 索引)
+    返回 (当前页的行, next_cursor)，没有下一页时 next_cursor 为 None
+    """
+    limit = get_page_limit()
+    cursor = request.args.get('cursor')
+    if cursor:
+        last_time, last_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            time_col < last_time,
+            and_(time_col == last_time, id_col < last_id)
+        ))
+
+    rows = query.order_by(time_col.desc(), id_col.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        # 按列名取值: 既支持 ORM 对象，也支持 SELECT 出来的具名列 (如会话表的 last_time)
+        next_cursor = encode_cursor(getattr(rows[-1], time_col.key), getattr(rows[-1], id_col.key))
+    return rows, next_cursor
+
+
+def paginate_by_rank(query, score_col, id_col):
+    """
+    搜索结果按相关度排序分页 (分数相同再按 id 倒序)
+    相关度没有稳定的时间顺序，这里游标里存的是偏移量
+    """
+    limit = get_page_limit()
+    offset = 0
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            tag, offset = _b64decode(cursor).split('|')
+            offset = int(offset)
+        except Exception:
+            raise ValueError("无效的分页游标")
+        # 不能用 assert: python -O 下会被去掉，负数偏移量一直传到 SQL 里
+        if tag != 'rank' or offset < 0:
+            raise ValueError("无效的分页游标")
+
+    rows = query.order_by(score_col.desc(), id_col.desc()) \
+        .offset(offset).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _b64encode(f"rank|{offset + limit}")
+    return rows, next_cursor
+
+
+def conversation_key(user_a, user_b):
+    """两个人之间会话的唯一标识，与谁先谁后无关: (3, 17) 和 (17, 3) 都是 '3_17'"""
+    lo, hi = sorted((int(user_a), int(user_b)))
+    return f"{lo}_{hi}"
+
+
+# ==========================================
+#  字段裁剪 (?fields=id,title,image)
+# ==========================================
+# 接口的字段表格式: {输出的 key: ([需要 SELECT 的列], row -> 值)}
+def parse_fields(spec):
+    """解析 ?fields= 参数，返回要输出的字段 (保持字段表里的顺序)，不传则返回全部"""
+    raw = request.args.get('fields')
+    if not raw:
+        return list(spec)
+    wanted = {f.strip() for f in raw.split(',') if f.strip()}
+    unknown = wanted - set(spec)
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(sorted(unknown))}")
+    return [f for f in spec if f in wanted]
+
 
-        # 保存路径
-        upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(upload_path)
+def select_columns(spec, fields, *always):
+    """根据要输出的字段算出需要 SELECT 的列 (always 里是分页排序必需的列)"""
+    columns = {}
+    for col in always:
+        columns[col.key] = col
+    for f in fields:
+        for col in spec[f][0]:
+            columns.setdefault(col.key, col)
+    return list(columns.values())
 
-        # 生成外部可访问的 URL
-        # 例如: http://localhost:5000/static/uploads/xxx.jpg
-        # _external=True 会生成带域名的完整 URL
-        return url_for('static', filename=f'uploads/{unique_filename}', _external=True)
 
-    return DEFAULT_IMAGE_URL
\ No newline at end of file
+def pack_row(row, fields, spec):
+    return {f: spec[f][1](row) for f in fields}
@@ -0,0 +1,194 @@
+"""
+按需生成的图片变体 (不同宽度 + WebP / AVIF)
+
+缩略图只有一个尺寸，卡片、详情页、聊天图片要的大小各不一样。
+/media/<文件名>?w=800 返回宽 800 的变体，格式按 Accept 协商 (AVIF > WebP > 原格式)，
+客户端没法设置 Accept 时 (比如 Flet 的 Image 只给 URL) 可以用 ?fmt=webp 指定。
+
+- 宽度向上取到 VARIANT_WIDTHS 里的档位，避免随意的 w 把缓存撑爆；比原图宽时不放大
+- 生成结果缓存在 UPLOAD_FOLDER/.variants/ 下，超过 VARIANT_CACHE_SIZE 时按最近使用时间淘汰 (LRU)
+- 转码和缩略图一样在独立的进程池里做 (thumbnails.get_executor)
+
+Pillow 是可选依赖，没装时不生成变体，直接返回原图。
+"""
+import os
+import threading
+import uuid
+import thumbnails
+from thumbnails import Image
+
+# 卡片 / 聊天图片 / 详情页 / 大图 (都按 2 倍屏算)
+VARIANT_WIDTHS = (200, 400, 800, 1600)
+# 变体缓存总大小上限 (字节)，超过后删掉最久没用过的，删到 90%
+VARIANT_CACHE_SIZE = 256 * 1024 * 1024
+VARIANT_DIR = '.variants'
+# 上传后由后台任务预先生成的变体: 客户端卡片 / 聊天 (200、400) 和详情页 (800) 用的 WebP
+PREWARM = ((200, 'webp'), (400, 'webp'), (800, 'webp'))
+
+# 输出格式 -> (MIME 类型, Pillow 保存参数)
+_ENCODERS = {
+    'avif': ('image/avif', {'quality': 55, 'speed': 8}),
+    'webp': ('image/webp', {'quality': 75, 'method': 4}),
+    'jpg': ('image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'png': ('image/png', {'optimize': True}),
+}
+# 当前 Pillow 能编码的现代格式，按优先级排列
+MODERN_FORMATS = [fmt for fmt in ('avif', 'webp')
+                  if Image is not None and f'.{fmt}' in Image.registered_extensions()]
+
+_cache_lock = threading.Lock()
+_cache_bytes = None  # 缓存目录当前的总大小，第一次用到时扫描一遍
+_inflight_lock = threading.Lock()
+_inflight = {}  # 正在生成的变体: 相对路径 -> Future
+
+
+def variant_width(w):
+    """把请求的宽度取到档位上 (向上取，超过最大档按最大档)"""
+    for width in VARIANT_WIDTHS:
+        if w <= width:
+            return width
+    return VARIANT_WIDTHS[-1]
+
+
+def negotiate_format(accept_mimetypes, original_ext, requested=None):
+    """
+    选输出格式: 显式指定的 fmt 优先，其次按 Accept 里客户端支持的现代格式，都不行就保持原格式
+    GIF 只取第一帧，退回时存成 PNG
+    """
+    fallback = 'jpg' if original_ext in ('jpg', 'jpeg') else 'png'
+    if requested:
+        return requested if requested in MODERN_FORMATS or requested == fallback else None
+    # 只认明确列出的类型: 几乎所有客户端都带 */*，不能据此认为它能解码 AVIF
+    accepted = {value for value, quality in accept_mimetypes if quality > 0}
+    for fmt in MODERN_FORMATS:
+        if _ENCODERS[fmt][0] in accepted:
+            return fmt
+    return fallback
+
+
+def mimetype(fmt):
+    return _ENCODERS[fmt][0]
+
+
+def variant_name(filename, width, fmt):
+    """ab/cd/<sha256>.jpg -> .variants/ab/cd/<sha256>_w800.webp (相对 UPLOAD_FOLDER)"""
+    stem = os.path.splitext(filename)[0]
+    return f"{VARIANT_DIR}/{stem}_w{width}.{fmt}"
+
+
+def render_variant(src, dst, width, fmt):
+    """在子进程里执行: 缩放到 width 宽 (不放大) 并转码，先写临时文件再改名，读的人不会看到半个文件"""
+    with Image.open(src) as im:
+        if im.width > width:
+            im.thumbnail((width, im.height * width // im.width + 1))
+        if fmt == 'jpg':
+            im = im.convert('RGB')
+        elif im.mode not in ('RGB', 'RGBA'):
+            im = im.convert('RGBA' if 'transparency' in im.info or im.mode in ('LA', 'PA') else 'RGB')
+        tmp = f"{dst}.{uuid.uuid4().hex}.tmp"
+        try:
+            im.save(tmp, format='JPEG' if fmt == 'jpg' else fmt.upper(), **_ENCODERS[fmt][1])
+            os.replace(tmp, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return os.path.getsize(dst)
+
+
+def cached_variant(folder, filename, width, fmt):
+    """变体已经生成过时刷新它的"最近使用时间" (LRU 按它淘汰) 并返回相对路径，否则返回 None"""
+    name = variant_name(filename, width, fmt)
+    try:
+        os.utime(os.path.join(folder, name))
+        return name
+    except FileNotFoundError:
+        return None
+
+
+def get_variant(folder, filename, width, fmt, workers=2, timeout=30, cache_size=VARIANT_CACHE_SIZE):
+    """
+    返回变体文件的相对路径 (相对 folder)，需要时先生成
+    同一个变体同时只生成一次，其余的请求等它的结果
+    没装 Pillow、原图损坏或超时返回 None，调用方退回原图
+    """
+    if Image is None:
+        return None
+    name = cached_variant(folder, filename, width, fmt)
+    if name is not None:
+        return name
+
+    name = variant_name(filename, width, fmt)
+    path = os.path.join(folder, name)
+    with _inflight_lock:
+        future = _inflight.get(name)
+        owner = future is None
+        if owner:
+            if os.path.exists(path):  # 查缓存之后、拿到锁之前刚好有人生成完
+                return name
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            future = thumbnails.get_executor(workers).submit(
+                render_variant, os.path.join(folder, filename), path, width, fmt)
+            _inflight[name] = future
+    if owner:
+        # 放在锁外面: 已经完成的 Future 会在当前线程里立即调用回调
+        future.add_done_callback(lambda f: _finished(f, folder, name, cache_size))
+    try:
+        future.result(timeout=timeout)
+    except Exception as e:
+        print(f"Variant error ({name}): {e}")
+        return None
+    return name
+
+
+def _finished(future, folder, name, cache_size):
+    """生成结束 (不管等的请求是不是已经超时走了): 记一次缓存大小，之后的请求直接读文件"""
+    with _inflight_lock:
+        _inflight.pop(name, None)
+    if not future.cancelled() and future.exception() is None:
+        _account(folder, future.result(), cache_size)
+
+
+def _scan(root):
+    entries = []
+    for dirpath, _, files in os.walk(root):
+        for f in files:
+            try:
+                st = os.stat(os.path.join(dirpath, f))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, os.path.join(dirpath, f)))
+    return entries
+
+
+def _account(folder, added, cache_size):
+    """记上新生成的变体大小，超出上限时按最近使用时间淘汰到 90%"""
+    global _cache_bytes
+    root = os.path.join(folder, VARIANT_DIR)
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan(root))
+        else:
+            _cache_bytes += added
+        if _cache_bytes <= cache_size:
+            return
+        # 多进程部署时各进程的计数会有偏差，淘汰时重新扫一遍以磁盘为准
+        entries = sorted(_scan(root))
+        _cache_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if _cache_bytes <= cache_size * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            _cache_bytes -= size
+
+
+def variant_paths(folder, filename):
+    """原图已经生成过的所有变体的绝对路径 (原图被删除时一起删掉)"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    directory = os.path.join(folder, VARIANT_DIR, os.path.dirname(filename))
+    try:
+        return [os.path.join(directory, f) for f in os.listdir(directory) if f.startswith(f"{stem}_w")]
+    except FileNotFoundError:
+        return []
@@ -1,10 +1,46 @@
 import requests
 import os
+import json
+import threading
+import time
 
 # 避免本地代理干扰
 os.environ["NO_PROXY"] = "127.0.0.1,localhost"
 API_BASE_URL = "http://127.0.0.1:5000/api"
 
+# 条件请求缓存: (url, 参数) -> (etag, 上次的响应)
+# 数据没变时后端返回 304，直接复用上次的响应体
+_etag_cache = {}
+_ETAG_CACHE_SIZE = 200
+
+
+def _cached_get(url, params=None):
+    key = (url, tuple(sorted((k, str(v)) for k, v in (params or {}).items() if v is not None)))
+    cached = _etag_cache.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+
+    res = requests.get(url, params=params, headers=headers)
+    if res.status_code == 304 and cached:
+        return cached[1]
+
+    etag = res.headers.get("ETag")
+    if res.status_code == 200 and etag:
+        if len(_etag_cache) >= _ETAG_CACHE_SIZE:
+            _etag_cache.pop(next(iter(_etag_cache)), None)  # 淘汰最早的一条
+        _etag_cache[key] = (etag, res)
+    return res
+
+
+def image_variant(url, width):
+    """
+    本站上传的图片 (/media/...) 按显示宽度取缩放后的 WebP 变体，外链 / 老图片原样返回
+    Flet 的 Image 只能给 URL、设置不了 Accept，所以直接用 fmt=webp 指定格式
+    """
+    if url and "/media/" in url and "?" not in url:
+        return f"{url}?w={width}&fmt=webp"
+    return url
+
+
 class APIClient:
     @staticmethod
     def login(username, password):
@@ -15,39 +51,78 @@ class APIClient:
         return requests.post(f"{API_BASE_URL}/register", json={"username": username, "password": password, "contact": contact})
 
     @staticmethod
-    def get_skills(keyword=None):
-        return requests.get(f"{API_BASE_URL}/skills", params={"q": keyword})
+    def get_skills(keyword=None, skill_type=None, cursor=None, fields=None):
+        params = {"q": keyword}
+        if fields: params['fields'] = ",".join(fields)  # 只要卡片用得到的字段
+        if skill_type is not None: params['type'] = skill_type  # 类型筛选交给后端
+        if cursor: params['cursor'] = cursor  # 翻页游标 (上一页返回的 next_cursor)
+        return _cached_get(f"{API_BASE_URL}/skills", params=params)
 
     @staticmethod
-    def get_lost_items(item_type=None, keyword=None, location=None):
+    def get_lost_items(item_type=None, keyword=None, location=None, cursor=None, fields=None):
         params = {}
+        if fields: params['fields'] = ",".join(fields)
         if keyword: params['keyword'] = keyword
         if location: params['location'] = location
         if item_type is not None: params['type'] = item_type
-        return requests.get(f"{API_BASE_URL}/lost-items", params=params)
+        if cursor: params['cursor'] = cursor
+        return _cached_get(f"{API_BASE_URL}/lost-items", params=params)
+
+    # --- 断点续传上传: 分块 PUT，网络断了从服务器已收到的位置接着传 ---
+    @staticmethod
+    def upload_file(file_path, user_id=None, max_retries=5):
+        """上传本地文件，返回服务器上的 URL (可以作为 image_url / avatar_url 提交)，失败抛出 RuntimeError"""
+        size = os.path.getsize(file_path)
+        res = requests.post(f"{API_BASE_URL}/uploads", json={
+            "filename": os.path.basename(file_path), "size": size, "user_id": user_id})
+        if res.status_code != 200:
+            raise RuntimeError(res.json().get("msg", "上传失败"))
+        session = res.json()["data"]
+        upload_url = f"{API_BASE_URL}/uploads/{session['upload_id']}"
+        offset, retries = 0, 0
+
+        with open(file_path, 'rb') as f:
+            while offset < size:
+                f.seek(offset)
+                chunk = f.read(session["chunk_size"])
+                try:
+                    res = requests.put(upload_url, params={"offset": offset}, data=chunk,
+                                       headers={"Content-Type": "application/octet-stream"}, timeout=60)
+                    if res.status_code in (200, 409):
+                        # 409: 服务器的进度和我们不一致，以服务器返回的为准
+                        offset, retries = res.json()["data"]["offset"], 0
+                        continue
+                    raise RuntimeError(res.json().get("msg", "上传失败"))
+                except requests.RequestException:
+                    retries += 1
+                    if retries > max_retries:
+                        raise RuntimeError("网络异常，上传失败")
+                    time.sleep(min(2 ** retries, 10))
+                    try:
+                        offset = requests.get(upload_url, timeout=10).json()["data"]["offset"]
+                    except (requests.RequestException, KeyError, ValueError):
+                        pass  # 问不到进度就按原来的 offset 重传，不一致时服务器会返回 409
+
+        res = requests.post(f"{upload_url}/finalize")
+        if res.status_code != 200:
+            raise RuntimeError(res.json().get("msg", "上传失败"))
+        return res.json()["data"]["url"]
 
     # --- 带文件上传的发布接口 ---
     @staticmethod
     def post_item(endpoint, form_data, file_path=None):
         url = f"{API_BASE_URL}/{endpoint}"
-        # 如果有文件路径且文件存在
+        # 如果有文件路径且文件存在，先分块传好图片，发布时只提交 URL
         if file_path and os.path.exists(file_path):
             try:
-                # 必须以二进制模式打开
-                with open(file_path, 'rb') as f:
-                    # files 字典: key='image' 对应后端 request.files['image']
-                    files = {'image': (os.path.basename(file_path), f)}
-                    # 注意：传 files 时不要传 json=...，而是用 data=form_data
-                    return requests.post(url, data=form_data, files=files)
+                form_data = {**form_data, "image_url": APIClient.upload_file(file_path, form_data.get("user_id"))}
             except Exception as e:
                 print(f"File upload error: {e}")
-                return requests.post(url, data=form_data)
-        else:
-            return requests.post(url, data=form_data)
+        return requests.post(url, data=form_data)
 
     @staticmethod
     def get_user_info(user_id):
-        return requests.get(f"{API_BASE_URL}/user/{user_id}")
+        return _cached_get(f"{API_BASE_URL}/user/{user_id}")
 
     @staticmethod
     def get_user_posts(user_id):
@@ -65,15 +140,10 @@ class APIClient:
         if username: form_data['username'] = username
         if contact: form_data['contact'] = contact
 
-        # 2. 如果有头像文件，使用 multipart/form-data 上传
+        # 2. 如果有头像文件，先走断点续传上传，再把 URL 交给后端
         if avatar_path and os.path.exists(avatar_path):
-            with open(avatar_path, 'rb') as f:
-                # files 字典里的 key 'avatar' 必须和后端 request.files.get('avatar') 对应
-                files = {'avatar': (os.path.basename(avatar_path), f)}
-                return requests.post(url, data=form_data, files=files)
-        else:
-            # 如果没有文件，只发文本
-            return requests.post(url, data=form_data)
+            form_data['avatar_url'] = APIClient.upload_file(avatar_path, user_id)
+        return requests.post(url, data=form_data)
     @staticmethod
     def delete_item(item_id, category):
         return requests.post(f"{API_BASE_URL}/delete", json={"id": item_id, "category": category})
@@ -101,12 +171,36 @@ class APIClient:
 
     @staticmethod
     def get_my_helps(user_id):
-        return requests.get(f"{API_BASE_URL}/user/helps/{user_id}")
+        return _cached_get(f"{API_BASE_URL}/user/helps/{user_id}")
+
 
+    @staticmethod
+    def get_messages(user_id, partner_id, since_id=None, before_id=None):
+        """不带 since_id / before_id 时返回最新的一页"""
+        params = {"user_id": user_id, "partner_id": partner_id}
+        if since_id is not None: params['since_id'] = since_id  # 只拉取这条之后的新消息
+        if before_id is not None: params['before_id'] = before_id  # 向上翻页: 这条之前的更早消息
+        return _cached_get(f"{API_BASE_URL}/messages", params=params)
+
+    @staticmethod
+    def poll_messages(user_id, partner_id, since_id=0, timeout=25):
+        """长轮询: 有新消息立即返回，否则后端最多挂起 timeout 秒后返回空列表"""
+        params = {"user_id": user_id, "partner_id": partner_id, "since_id": since_id, "timeout": timeout}
+        return requests.get(f"{API_BASE_URL}/messages/poll", params=params, timeout=timeout + 10)
+
+    @staticmethod
+    def mark_read(user_id, partner_id, last_read_id=None):
+        """把对方发给我的消息标记为已读 (读到 last_read_id 为止，不传则全部)"""
+        payload = {"sender_id": partner_id, "receiver_id": user_id}
+        if last_read_id is not None: payload['last_read_id'] = last_read_id
+        return requests.post(f"{API_BASE_URL}/messages/read", json=payload)
 
     @staticmethod
-    def get_messages(user_id, partner_id):
-        return requests.get(f"{API_BASE_URL}/messages", params={"user_id": user_id, "partner_id": partner_id})
+    def get_conversations(user_id, cursor=None):
+        """会话列表: 对方信息、最后一条消息、我的未读数"""
+        params = {"user_id": user_id}
+        if cursor: params['cursor'] = cursor
+        return _cached_get(f"{API_BASE_URL}/conversations", params=params)
 
 
     @staticmethod
@@ -118,11 +212,37 @@ class APIClient:
             form_data['content'] = content
 
         if image_path and os.path.exists(image_path):
-            with open(image_path, 'rb') as f:
-                files = {'image': (os.path.basename(image_path), f)}
-                return requests.post(url, data=form_data, files=files)
-        else:
-            return requests.post(url, data=form_data)
+            form_data['image_url'] = APIClient.upload_file(image_path, sender_id)
+        return requests.post(url, data=form_data)
+
+    @staticmethod
+    def listen_events(user_id, on_event):
+        """
+        在后台线程订阅当前用户的实时事件 (私信 / 订单状态 / 积分变化)
+        on_event(event_type, data) 在后台线程里被调用
+        返回一个 stop() 函数，退出登录时调用
+        """
+        stopped = threading.Event()
+
+        def run():
+            while not stopped.is_set():
+                try:
+                    with requests.get(f"{API_BASE_URL}/events", params={"user_id": user_id},
+                                      stream=True, timeout=(5, 60)) as res:
+                        event_type = None
+                        for line in res.iter_lines(decode_unicode=True):
+                            if stopped.is_set(): return
+                            if line.startswith("event:"):
+                                event_type = line[6:].strip()
+                            elif line.startswith("data:") and event_type:
+                                on_event(event_type, json.loads(line[5:]))
+                                event_type = None
+                except Exception as e:
+                    print(f"Event stream error: {e}")
+                    time.sleep(3)  # 断线后稍等再重连
+
+        threading.Thread(target=run, daemon=True).start()
+        return stopped.set
 
     @staticmethod
     def get_tags():
@@ -1,4 +1,5 @@
 import flet as ft
+from api_client import image_variant
 
 
 def create_skill_card(item, on_click):
@@ -20,7 +21,7 @@ def create_skill_card(item, on_click):
         content=ft.Column([
             # 图片部分
             ft.Image(
-                src=item['image'],
+                src=image_variant(item['image'], 400) if item.get('image') else item.get('thumb'),  # 按卡片宽度取小图
                 width=float("inf"),
                 height=110,
                 fit=ft.ImageFit.COVER,
@@ -79,7 +80,7 @@ def create_lost_card(item, on_click):
         content=ft.Row([
             # 左侧图片
             ft.Image(
-                src=item['image'],
+                src=image_variant(item['image'], 200) if item.get('image') else item.get('thumb'),  # 按卡片宽度取小图
                 width=100,
                 height=100,
                 fit=ft.ImageFit.COVER,
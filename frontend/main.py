@@ -7,6 +7,7 @@ from view.home import HomeView
 from view.my_help import MyHelpView
 from view.my_posts import MyPostsView
 from view.chat import ChatView  # 导入聊天页面
+from api_client import APIClient
 
 
 def main(page: ft.Page):
@@ -19,6 +20,10 @@ def main(page: ft.Page):
 
     # 全局状态
     current_user = {"id": None, "name": None}
+    # 当前显示的页面，收到实时事件时据此决定是否刷新
+    current_view = {"name": None, "partner_id": None}
+    # 实时事件订阅的停止函数
+    event_listener = {"stop": None}
 
     # 全局提示框
     snack_bar = ft.SnackBar(ft.Text(""))
@@ -36,13 +41,31 @@ def main(page: ft.Page):
     #  路由与导航逻辑
     # ==========================================
 
+    # --- 实时事件: 替代轮询，订单/积分/私信有变化时后端主动推送 ---
+    def on_event(event_type, data):
+        if event_type == 'order':
+            tips = {"accepted": "已被接单", "finished": "已完成", "reviewed": "收到了评价"}
+            show_msg(f"《{data.get('title', '')}》{tips.get(data.get('action'), '状态已更新')}", "blue")
+            if current_view['name'] == 'help': go_my_help(None)
+        elif event_type == 'points':
+            show_msg(f"积分 {data['change']:+d}，当前 {data['points']} 分", "green")
+            if current_view['name'] == 'profile': switch_tab(2)
+        elif event_type == 'message':
+            # 正在和对方聊天时聊天页自己会收到，不用提示
+            if not (current_view['name'] == 'chat' and str(current_view['partner_id']) == str(data.get('sender_id'))):
+                show_msg("收到一条新私信", "blue")
+
     def login_success(user_data):
         current_user['id'] = user_data['user_id']
         current_user['name'] = user_data['username']
+        event_listener['stop'] = APIClient.listen_events(current_user['id'], on_event)
         show_msg(f"欢迎 {current_user['name']}", "green")
         switch_tab(2)
 
     def logout(e):
+        if event_listener['stop']:
+            event_listener['stop']()
+            event_listener['stop'] = None
         current_user['id'] = None
         current_user['name'] = None
         show_msg("已退出登录", "green")
@@ -54,6 +77,7 @@ def main(page: ft.Page):
         跳转到聊天页面
         :param back_callback: 点击返回键时的回调函数
         """
+        current_view.update(name='chat', partner_id=partner_id)
         body.content = ChatView(
             current_user=current_user,
             partner_id=partner_id,
@@ -65,6 +89,7 @@ def main(page: ft.Page):
 
     # --- 详情页跳转 ---
     def go_detail(item, category):
+        current_view.update(name='detail', partner_id=None)
         # 定义从详情页进入聊天时的返回逻辑：回到首页 (switch_tab(0))
         def chat_callback(pid, pname):
             render_chat(pid, pname, lambda e: switch_tab(0))
@@ -81,6 +106,7 @@ def main(page: ft.Page):
 
     # --- 我参与的互助跳转 ---
     def go_my_help(e):
+        current_view.update(name='help', partner_id=None)
         # 定义从列表进入聊天时的返回逻辑：回到当前列表 (重新调用 go_my_help)
         def chat_callback(pid, pname):
             render_chat(pid, pname, lambda e: go_my_help(None))
@@ -96,6 +122,7 @@ def main(page: ft.Page):
 
     # --- 我的发布跳转 ---
     def go_my_posts(e):
+        current_view.update(name='posts', partner_id=None)
         body.content = MyPostsView(
             current_user['id'],
             lambda e: switch_tab(2),
@@ -106,6 +133,7 @@ def main(page: ft.Page):
     # --- 底部导航切换 ---
     def switch_tab(e):
         idx = e if isinstance(e, int) else e.control.data
+        current_view.update(name={0: 'home', 1: 'post', 2: 'profile'}[idx], partner_id=None)
 
         # 更新底部导航高亮
         for i, btn in enumerate(nav_bar.content.controls):
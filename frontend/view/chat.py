@@ -1,12 +1,13 @@
 import flet as ft
-from api_client import APIClient
+from api_client import APIClient, image_variant
 import time
 import threading
 
 
 def ChatView(current_user, partner_id, partner_name, on_back, show_msg):
     # 消息列表容器
-    chat_list = ft.ListView(expand=True, spacing=10, padding=20, auto_scroll=True)
+    # 不用 auto_scroll: 向上翻页插入旧消息时不能跳到底部，新消息到达时手动滚到底
+    chat_list = ft.ListView(expand=True, spacing=10, padding=20, on_scroll_interval=100)
 
     # 输入框
     input_box = ft.TextField(hint_text="发送消息...", expand=True, border_radius=20, bgcolor="white",
@@ -14,6 +15,11 @@ def ChatView(current_user, partner_id, partner_name, on_back, show_msg):
 
     # 状态标记
     is_active = True
+    last_id = None  # 已显示的最后一条消息 id，轮询时只拉取它之后的消息
+    first_id = None  # 已显示的第一条消息 id，向上翻页时拉取它之前的消息
+    has_older = False  # 服务端是否还有更早的消息
+    is_loading_older = False
+    list_lock = threading.Lock()  # 轮询线程和发送按钮都会往列表里追加
 
     def render_message(msg):
         """渲染单个消息气泡"""
@@ -21,9 +27,9 @@ def ChatView(current_user, partner_id, partner_name, on_back, show_msg):
         content = msg['content']
         msg_type = msg.get('type', 'text')  # 兼容旧接口
 
-        # 简单处理：如果是图片类型但在纯文本模式下，显示提示文字
         if msg_type == 'image' or content.startswith('image:'):
-            content_widget = ft.Text("[图片]", color="blue")
+            url = content.replace("image:", "")
+            content_widget = ft.Image(src=image_variant(url, 400), width=200, fit=ft.ImageFit.CONTAIN, border_radius=8)
         else:
             content_widget = ft.Text(content, color="white" if is_me else "black", size=16)
 
@@ -40,18 +46,85 @@ def ChatView(current_user, partner_id, partner_name, on_back, show_msg):
             alignment=ft.MainAxisAlignment.END if is_me else ft.MainAxisAlignment.START
         )
 
-    def load_messages():
-        """加载历史消息"""
+    def append_messages(msgs):
+        """追加新消息 (调用方持有 list_lock)，已经显示过的跳过"""
+        nonlocal last_id, first_id
+        added = False
+        has_unread = False
+        for m in msgs:
+            if last_id is not None and m['id'] <= last_id: continue
+            chat_list.controls.append(render_message(m))
+            last_id = m['id']
+            if first_id is None: first_id = m['id']
+            added = True
+            has_unread = has_unread or (not m['is_me'] and m.get('unread'))
+        if added and chat_list.page:
+            chat_list.update()
+            chat_list.scroll_to(offset=-1, duration=200)
+        if has_unread: mark_read()
+
+    def mark_read():
+        """对方的新消息已经显示出来了，推进已读水位"""
         try:
-            res = APIClient.get_messages(current_user['id'], partner_id)
-            if res.status_code == 200:
-                msgs = res.json().get('data', [])
-                chat_list.controls.clear()
-                for m in msgs:
-                    chat_list.controls.append(render_message(m))
-                if chat_list.page: chat_list.update()
+            APIClient.mark_read(current_user['id'], partner_id, last_read_id=last_id)
         except Exception as e:
-            print(f"Chat load error: {e}")
+            print(f"Chat mark read error: {e}")
+
+    def load_latest():
+        """首次进入只加载最新的一页，更早的消息等用户往上滑再拉"""
+        nonlocal has_older
+        res = APIClient.get_messages(current_user['id'], partner_id)
+        if res.status_code != 200: return
+        body = res.json()
+        has_older = body.get('has_more', False)
+        append_messages(body.get('data', []))
+
+    def load_messages():
+        """首次加载最新一页，之后只追加新消息"""
+        with list_lock:
+            try:
+                if last_id is None:
+                    load_latest()
+                    return
+                has_more = True
+                while has_more:
+                    res = APIClient.get_messages(current_user['id'], partner_id, since_id=last_id)
+                    if res.status_code != 200: break
+                    body = res.json()
+                    msgs = body.get('data', [])
+                    append_messages(msgs)
+                    has_more = body.get('has_more', False) and bool(msgs)
+            except Exception as e:
+                print(f"Chat load error: {e}")
+
+    def load_older():
+        """向上翻页: 拉取 first_id 之前的一页，插到列表顶部"""
+        nonlocal first_id, has_older
+        with list_lock:
+            try:
+                res = APIClient.get_messages(current_user['id'], partner_id, before_id=first_id)
+                if res.status_code != 200: return
+                body = res.json()
+                msgs = body.get('data', [])
+                has_older = body.get('has_more', False) and bool(msgs)
+                if msgs:
+                    chat_list.controls[0:0] = [render_message(m) for m in msgs]
+                    first_id = msgs[0]['id']
+                    chat_list.update()
+            except Exception as e:
+                print(f"Chat load older error: {e}")
+
+    def on_chat_scroll(e: ft.OnScrollEvent):
+        nonlocal is_loading_older
+        if not has_older or first_id is None or is_loading_older: return
+        if e.pixels <= 50:
+            is_loading_older = True
+            try:
+                load_older()
+            finally:
+                is_loading_older = False
+
+    chat_list.on_scroll = on_chat_scroll
 
     def send_text(e):
         txt = input_box.value
@@ -67,11 +140,24 @@ def ChatView(current_user, partner_id, partner_name, on_back, show_msg):
         except Exception as ex:
             show_msg(str(ex))
 
-    # --- 轮询逻辑 ---
+    # --- 长轮询逻辑: 请求会在后端挂起，直到有新消息或超时 ---
     def poll_loop():
+        load_messages()
         while is_active:
-            load_messages()
-            time.sleep(3)
+            try:
+                res = APIClient.poll_messages(current_user['id'], partner_id, since_id=last_id or 0)
+                if not is_active: break
+                if res.status_code == 200:
+                    body = res.json()
+                    with list_lock:
+                        append_messages(body.get('data', []))
+                    if body.get('has_more'): load_messages()
+                else:
+                    time.sleep(3)
+            except Exception as e:
+                # 网络异常时退避一下再重连
+                print(f"Chat poll error: {e}")
+                time.sleep(3)
 
     def on_mount():
         if chat_list.page:
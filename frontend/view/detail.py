@@ -1,10 +1,10 @@
 import flet as ft
-from api_client import APIClient
+from api_client import APIClient, image_variant
 
 
 # 【修改】增加了参数 on_nav_to_chat
 def DetailView(item, category, on_back, show_msg, current_user, on_nav_to_chat):
-    detail_img = ft.Image(src=item['image'], width=float("inf"), height=200, fit=ft.ImageFit.COVER)
+    detail_img = ft.Image(src=image_variant(item['image'], 800), width=float("inf"), height=200, fit=ft.ImageFit.COVER)
 
     # 1. 聊天/联系逻辑
     def go_chat(e):
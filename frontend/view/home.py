@@ -2,6 +2,10 @@ import flet as ft
 from api_client import APIClient
 from components.cards import create_skill_card, create_lost_card
 
+# 首页卡片 (以及点进去的详情页) 用到的字段，其余字段不让后端查询和传输
+SKILL_CARD_FIELDS = ["id", "title", "cost", "type", "image", "thumb", "user", "user_id"]
+LOST_CARD_FIELDS = ["id", "title", "desc", "location", "type", "image", "thumb", "time", "user", "user_id"]
+
 
 class HomeView:
     def __init__(self, page, show_msg, on_item_click, get_current_user):
@@ -17,6 +21,11 @@ class HomeView:
         self.filter_lost_keyword = ""
         self.filter_lost_location = ""
 
+        # --- 分页状态 ---
+        self.next_cursor = None  # 后端返回的下一页游标，None 表示没有更多了
+        self.current_keyword = ""
+        self.is_loading_more = False
+
         # --- 文件选择器 ---
         self.selected_image_path = None
         self.file_picker = ft.FilePicker(on_result=self.on_file_picked)
@@ -67,7 +76,8 @@ class HomeView:
         )
 
         # 5. 列表网格
-        self.main_grid = ft.GridView(expand=True, spacing=10, run_spacing=10, padding=10)
+        self.main_grid = ft.GridView(expand=True, spacing=10, run_spacing=10, padding=10,
+                                     on_scroll=self.on_grid_scroll, on_scroll_interval=100)
 
         # 6. 发布页组件
         self.input_title = ft.TextField(label="标题 (简短清晰)")
@@ -244,6 +254,8 @@ class HomeView:
     # --- 加载数据 ---
     def load_data(self, keyword_from_bar=""):
         self.main_grid.controls.clear()
+        self.next_cursor = None
+        self.current_keyword = keyword_from_bar
 
         # 布局比例
         if self.current_category == "skill":
@@ -253,31 +265,50 @@ class HomeView:
             self.main_grid.runs_count = 1
             self.main_grid.child_aspect_ratio = 2.5
 
+        self.fetch_page()
+        self.page.update()
+
+    # --- 滚动到底部时加载下一页 ---
+    def on_grid_scroll(self, e: ft.OnScrollEvent):
+        if not self.next_cursor or self.is_loading_more: return
+        if e.pixels >= e.max_scroll_extent - 100:
+            self.is_loading_more = True
+            try:
+                self.fetch_page(self.next_cursor)
+                self.page.update()
+            finally:
+                self.is_loading_more = False
+
+    # --- 请求一页数据并追加到网格 ---
+    def fetch_page(self, cursor=None):
+        keyword_from_bar = self.current_keyword
         try:
             if self.current_category == "skill":
                 final_keyword = keyword_from_bar if keyword_from_bar else self.filter_skill_keyword
-                res = APIClient.get_skills(final_keyword)
+                res = APIClient.get_skills(final_keyword, skill_type=self.filter_skill_type, cursor=cursor,
+                                           fields=SKILL_CARD_FIELDS)
                 if res.status_code == 200:
-                    data = res.json().get('data', [])
-                    for item in data:
-                        if self.filter_skill_type is not None:
-                            if item.get('type') != self.filter_skill_type: continue
+                    body = res.json()
+                    self.next_cursor = body.get('next_cursor')
+                    for item in body.get('data', []):
                         self.main_grid.controls.append(
                             create_skill_card(item, lambda e: self.on_item_click(e.control.data, "skill")))
             else:
                 res = APIClient.get_lost_items(
                     keyword=keyword_from_bar or self.filter_lost_keyword,
-                    location=self.filter_lost_location
+                    location=self.filter_lost_location,
+                    cursor=cursor,
+                    fields=LOST_CARD_FIELDS
                 )
                 if res.status_code == 200:
-                    for item in res.json().get('data', []):
+                    body = res.json()
+                    self.next_cursor = body.get('next_cursor')
+                    for item in body.get('data', []):
                         self.main_grid.controls.append(
                             create_lost_card(item, lambda e: self.on_item_click(e.control.data, "lost")))
         except Exception as e:
             print(f"Load error: {e}")
 
-        self.page.update()
-
     # --- 获取主页视图 ---
     def get_main_view(self):
         self.load_data()
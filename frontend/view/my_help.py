@@ -142,7 +142,7 @@ def MyHelpView(user_id, on_back, show_msg, on_nav_to_chat):
                         bgcolor="white", padding=10, border_radius=10, border=ft.border.all(1, "#eee"),
                         content=ft.Column([
                             ft.Row([
-                                ft.Image(src=item['image'], width=60, height=60, border_radius=5),
+                                ft.Image(src=item.get('thumb') or item['image'], width=60, height=60, border_radius=5),
                                 ft.Container(expand=True, content=ft.Column([
                                     ft.Row([
                                         ft.Text(item['title'], size=16, weight="bold"),
@@ -58,7 +58,7 @@ def MyPostsView(user_id, on_back, show_msg):
                 posts_list.controls.append(ft.Container(
                     bgcolor="white", padding=10, border_radius=10,
                     content=ft.Row([
-                        ft.Image(src=item['image'], width=60, height=60, border_radius=5),
+                        ft.Image(src=item.get('thumb') or item['image'], width=60, height=60, border_radius=5),
                         ft.Container(expand=True, content=ft.Column([
                             ft.Row([status_widget, ft.Text(item['create_time'], size=10, color="grey")], alignment="spaceBetween"),
                             ft.Text(item['title'], size=16, weight="bold", max_lines=1),
@@ -89,7 +89,7 @@ def ProfileView(user_id, on_logout, show_msg, on_nav_to_help, on_nav_to_my_posts
                     on_tap=lambda _: avatar_picker.pick_files(allow_multiple=False,
                                                               allowed_extensions=["jpg", "png", "jpeg"]),
                     content=ft.Stack([
-                        ft.CircleAvatar(foreground_image_src=u['avatar'], radius=35),
+                        ft.CircleAvatar(foreground_image_src=u.get('avatar_thumb') or u['avatar'], radius=35),
                         # 相机小图标
                         ft.Container(
                             content=ft.Icon(ft.Icons.CAMERA_ALT, size=14, color="white"),